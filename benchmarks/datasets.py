@@ -0,0 +1,72 @@
+# Synthetic datasets for the benchmarks
+#
+# Each generator yields Instances for a dataset of the given shape, built from a seeded random
+# generator so every run (and every machine) benchmarks exactly the same data. Rows are
+# generated lazily, so even the largest sizes never have to fit in memory.
+#   - numeric: dense numeric attributes and a nominal class
+#   - nominal: mostly nominal attributes (the "nominal-heavy" case) and a nominal class
+#   - sparse: thousands of numeric attributes, of which only a few are non-zero in each row
+
+from wekapy import Feature, Instance, SparseInstance
+import random
+
+CLASSES = "{yes,no}"
+SIZES = [1000, 10000, 100000, 1000000, 10000000]
+
+
+def numeric_attributes(columns=20):
+    return [("x{}".format(i), "numeric") for i in range(columns)] + [("class", CLASSES)]
+
+
+def nominal_attributes(columns=20, values=5):
+    declaration = "{" + ",".join("v{}".format(j) for j in range(values)) + "}"
+    attributes = [("n{}".format(i), declaration) for i in range(columns)]
+    attributes.extend(("x{}".format(i), "numeric") for i in range(columns // 4))
+    return attributes + [("class", CLASSES)]
+
+
+def sparse_attributes(columns=10000):
+    return [("w{}".format(i), "numeric") for i in range(columns)] + [("class", CLASSES)]
+
+
+def numeric(rows, columns=20, seed=0):
+    generator = random.Random(seed)
+    attributes = numeric_attributes(columns)
+    for i in range(rows):
+        features = [Feature(name, round(generator.gauss(0, 1), 6), possible_values)
+                    for name, possible_values in attributes[:-1]]
+        features.append(Feature("class", "yes" if generator.random() < 0.5 else "no", CLASSES))
+        yield Instance(features)
+
+
+def nominal(rows, columns=20, values=5, seed=0):
+    generator = random.Random(seed)
+    attributes = nominal_attributes(columns, values)
+    for i in range(rows):
+        features = []
+        for name, possible_values in attributes[:-1]:
+            if possible_values == "numeric":
+                features.append(Feature(name, generator.randint(0, 1000), possible_values))
+            else:
+                features.append(Feature(name, "v{}".format(generator.randrange(values)), possible_values))
+        features.append(Feature("class", "yes" if generator.random() < 0.5 else "no", CLASSES))
+        yield Instance(features)
+
+
+def sparse(rows, columns=10000, density=0.002, seed=0):
+    generator = random.Random(seed)
+    attributes = sparse_attributes(columns)
+    non_zero = max(1, int(columns * density))
+    for i in range(rows):
+        instance = SparseInstance(attributes)
+        for index in generator.sample(range(columns), non_zero):
+            instance.set_value(index, generator.randint(1, 5))
+        instance.set_value(columns, "yes" if generator.random() < 0.5 else "no")
+        yield instance
+
+
+GENERATORS = {
+    "numeric": numeric,
+    "nominal": nominal,
+    "sparse": sparse,
+}
@@ -0,0 +1,257 @@
+# WekaPy benchmarks
+#
+# Times WekaPy's Python-side hot paths (generating ARFF files, parsing Weka's predictions,
+# splitting and reading ARFF files) and end-to-end training and testing runs, on the seeded
+# synthetic datasets in datasets.py. Weka is replaced by the stub java in stub/, which prints
+# realistic Weka output, so the benchmarks run on machines without Java and time only WekaPy.
+#
+#   python benchmarks/run.py                                  # run everything at 1k and 100k rows
+#   python benchmarks/run.py --rows 1000000 --only create_arff
+#   python benchmarks/run.py --save baseline.json             # save the results as a baseline
+#   python benchmarks/run.py --compare baseline.json          # compare against a saved baseline
+#
+# With --compare, the exit status is 1 if any benchmark's median time is more than --threshold
+# (by default 10%) slower than in the baseline.
+# Up to IN_MEMORY_ROWS rows, the Instances a benchmark writes are generated before it is timed.
+# Larger datasets would not fit in memory as Instances, so they are generated lazily while the
+# benchmark runs, and their times include generating the rows. create_arff/dataset, which needs
+# the whole Dataset in memory, is skipped for them.
+
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from wekapy import Model, Filter, Dataset, ProcessExecutor, WorkerExecutor, read_arff
+from wekapy.ArffWriter import ArffWriter
+from wekapy.Helpers import java_command
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import datasets
+
+IN_MEMORY_ROWS = 100000
+
+
+class Context:
+    def __init__(self, rows, seed, work_dir):
+        self.rows = rows
+        self.seed = seed
+        self.work_dir = work_dir
+
+    def model(self, executor=None, transport="file"):
+        return Model("bayes.NaiveBayes", arff_dir=os.path.join(self.work_dir, "arff"),
+                     model_dir=os.path.join(self.work_dir, "models"),
+                     executor=executor or ProcessExecutor(os.path.join(self.work_dir, "worker")), transport=transport)
+
+    def arff_file(self, kind):
+        path = os.path.join(self.work_dir, "{}-{}.arff".format(kind, self.rows))
+        if not os.path.exists(path):
+            with ArffWriter(path, kind) as writer:
+                writer.write_instances(datasets.GENERATORS[kind](self.rows, seed=self.seed))
+        return path
+
+
+# Each benchmark is a setup function, which prepares its input outside the timing (or returns
+# None to skip the benchmark at this size), and a run function, which is timed.
+
+# A function returning the Instances of a dataset: a list built in advance, or a new lazy
+# generator above IN_MEMORY_ROWS.
+def instance_source(context, kind):
+    generate = lambda: datasets.GENERATORS[kind](context.rows, seed=context.seed)
+    if context.rows > IN_MEMORY_ROWS:
+        return generate
+    instances = list(generate())
+    return lambda: instances
+
+
+def setup_instances(kind):
+    return lambda context: (context.model(), instance_source(context, kind))
+
+
+def run_create_arff(state):
+    model, instances = state
+    model.create_arff(instances(), "training")
+    model.close()
+
+
+def setup_dataset(context):
+    if context.rows > IN_MEMORY_ROWS:
+        return None
+    dataset = Dataset.from_instances(datasets.numeric(context.rows, seed=context.seed))
+    return context.model(), lambda: dataset
+
+
+def setup_predictions(distribution):
+    def setup(context):
+        model = context.model()
+        options = java_command(100) + ["weka.classifiers.bayes.NaiveBayes", "-T", context.arff_file("numeric"),
+                                       "-l", "model", "-p", "0"]
+        if distribution:
+            options.append("-distribution")
+        process_output, time_taken = model.executor.run(options)
+        return model, process_output, ["yes", "no"] if distribution else None
+    return setup
+
+
+def run_parse_predictions(state):
+    model, process_output, labels = state
+    model.start_metrics("test")
+    model.finish_test(process_output, labels)
+
+
+def setup_file(context):
+    return context, context.arff_file("numeric")
+
+
+def run_split(state):
+    context, arff_file = state
+    for output_file in Filter().split(arff_file, seed=1):
+        os.remove(output_file)
+
+
+def run_read_arff(state):
+    context, arff_file = state
+    with read_arff(arff_file) as arff:
+        for row in arff.rows():
+            pass
+
+
+def setup_end_to_end(executor, transport="file"):
+    def setup(context):
+        instances = instance_source(context, "numeric")
+        worker = WorkerExecutor(build_root=os.path.join(context.work_dir, "worker")) if executor == "worker" else None
+        return context.model(worker, transport), instances
+    return setup
+
+
+def run_end_to_end(state):
+    model, instances = state
+    model.train(instances=instances())
+    model.test(instances=instances())
+    model.close()
+    model.executor.close()
+
+
+BENCHMARKS = [
+    ("create_arff/numeric", setup_instances("numeric"), run_create_arff),
+    ("create_arff/nominal", setup_instances("nominal"), run_create_arff),
+    ("create_arff/sparse", setup_instances("sparse"), run_create_arff),
+    ("create_arff/dataset", setup_dataset, run_create_arff),
+    ("parse_predictions", setup_predictions(False), run_parse_predictions),
+    ("parse_distribution", setup_predictions(True), run_parse_predictions),
+    ("split", setup_file, run_split),
+    ("read_arff", setup_file, run_read_arff),
+    ("end_to_end/process", setup_end_to_end("process"), run_end_to_end),
+    ("end_to_end/worker", setup_end_to_end("worker"), run_end_to_end),
+    ("end_to_end/process_pipe", setup_end_to_end("process", "pipe"), run_end_to_end),
+    ("end_to_end/worker_pipe", setup_end_to_end("worker", "pipe"), run_end_to_end),
+]
+
+
+def run_benchmark(name, setup, run, context, repeat):
+    times = []
+    for i in range(repeat):
+        state = setup(context)
+        if state is None:
+            return None
+        start_time = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start_time)
+    times.sort()
+    median = times[len(times) // 2]
+    return {
+        "rows": context.rows,
+        "min": times[0],
+        "median": median,
+        "rows_per_second": context.rows / median if median > 0 else None,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print("\n{:<36} {:>12} {:>12} {:>9}".format("benchmark", "baseline", "current", "change"))
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        before = baseline[key]["median"]
+        after = results[key]["median"]
+        change = after / before - 1 if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print("{:<36} {:>11.4f}s {:>11.4f}s {:>+8.1%}{}".format(key, before, after, change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WekaPy against a stub Weka.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000],
+                        help="dataset sizes to run (up to {})".format(datasets.SIZES[-1]))
+    parser.add_argument("--repeat", type=int, default=3, help="times to run each benchmark (the median is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose names start with these")
+    parser.add_argument("--save", help="save the results as JSON to this file")
+    parser.add_argument("--compare", help="compare the results with a baseline saved with --save")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown (as a fraction) reported as a regression by --compare")
+    args = parser.parse_args()
+
+    os.environ["PATH"] = os.path.join(BENCHMARK_DIR, "stub") + os.pathsep + os.environ.get("PATH", "")
+    work_dir = tempfile.mkdtemp(prefix="wekapy-benchmarks-")
+    results = {}
+    try:
+        print("{:<36} {:>12} {:>12} {:>14}".format("benchmark", "min", "median", "rows/s"))
+        for rows in args.rows:
+            context = Context(rows, args.seed, work_dir)
+            for name, setup, run in BENCHMARKS:
+                if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                    continue
+                key = "{}/{}".format(name, rows)
+                result = run_benchmark(name, setup, run, context, args.repeat)
+                if result is None:
+                    print("{:<36} {:>12}".format(key, "skipped"))
+                    continue
+                results[key] = result
+                print("{:<36} {:>11.4f}s {:>11.4f}s {:>14.0f}".format(
+                    key, results[key]["min"], results[key]["median"], results[key]["rows_per_second"] or 0))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump({
+                "date": datetime.datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "commit": git_commit(),
+                "results": results,
+            }, output, indent=2, sort_keys=True)
+        print("\nSaved results to {}".format(args.save))
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\n{} benchmark(s) regressed by more than {:.0%}.".format(len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR,
+                                       stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# WekaPy JVM startup benchmark
+#
+# Times short Weka jobs that each start a new JVM (scoring a small test set and running a filter),
+# before and after building a class data sharing archive with warmup(), under each launch
+# profile. Unlike run.py this needs a real JDK (11 or later) and weka.jar, since it measures the
+# JVM itself:
+#
+#   python benchmarks/startup.py --classpath /path/to/weka.jar
+#   python benchmarks/startup.py --classpath weka.jar --runs 20 --profiles default short
+#
+# The baseline runs without any archive or launch flags, as WekaPy did before launch profiles.
+
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from wekapy import Model, Filter, LaunchProfile, warmup
+from wekapy.ArffWriter import ArffWriter
+from wekapy.LaunchProfile import PROFILES, archive_file
+import argparse
+import shutil
+import tempfile
+import time
+import datasets
+
+BASELINE = LaunchProfile(class_data_sharing=False)
+
+
+def time_runs(run, runs):
+    times = []
+    for i in range(runs):
+        start_time = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start_time)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def benchmark_profile(profile, args, work_dir, test_file):
+    model = Model("bayes.NaiveBayes", classpath=args.classpath, profile=profile,
+                  arff_dir=os.path.join(work_dir, "arff"), model_dir=os.path.join(work_dir, "models"))
+    model.train(training_file=test_file, folds=2)
+    filter_output = os.path.join(work_dir, "filtered.arff")
+    weka_filter = Filter(classpath=args.classpath, profile=profile)
+    results = {
+        "test": time_runs(lambda: model.test(test_file=test_file), args.runs),
+        "filter": time_runs(lambda: weka_filter.filter(["weka.filters.unsupervised.attribute.Normalize"],
+                                                       test_file, filter_output), args.runs),
+    }
+    model.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JVM startup with and without class data sharing.")
+    parser.add_argument("--classpath", help="Weka's classpath (by default $CLASSPATH)")
+    parser.add_argument("--runs", type=int, default=10, help="JVMs to start for each job (the median is kept)")
+    parser.add_argument("--rows", type=int, default=100, help="rows in the test set")
+    parser.add_argument("--profiles", nargs="+", default=["default", "short"], choices=sorted(PROFILES),
+                        help="launch profiles to time with the archive")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="wekapy-startup-")
+    archive_dir = os.path.join(work_dir, "cds")
+    profiles = [("baseline", BASELINE)]
+    for name in args.profiles:
+        profile = PROFILES[name]
+        profiles.append((name, LaunchProfile(profile.initial_memory, profile.gc, profile.tiered_stop_at_level,
+                                             archive_dir=archive_dir, options=profile.options)))
+    try:
+        test_file = os.path.join(work_dir, "test.arff")
+        with ArffWriter(test_file, "startup") as writer:
+            writer.write_instances(datasets.numeric(args.rows))
+        start_time = time.perf_counter()
+        warmup(args.classpath, archive_dir=archive_dir, build_root=os.path.join(work_dir, "worker"))
+        print("Built {} in {:.1f}s".format(archive_file(args.classpath, archive_dir), time.perf_counter() - start_time))
+
+        results = {}
+        print("\n{:<12} {:<8} {:>10} {:>10} {:>9}".format("profile", "job", "min", "median", "speedup"))
+        for name, profile in profiles:
+            results[name] = benchmark_profile(profile, args, work_dir, test_file)
+            for job, (fastest, median) in sorted(results[name].items()):
+                baseline = results["baseline"][job][1]
+                print("{:<12} {:<8} {:>9.3f}s {:>9.3f}s {:>8.2f}x".format(
+                    name, job, fastest, median, baseline / median if median > 0 else 0.0))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# WekaPyWorker smoke test
+#
+# Compiles wekapy/java/WekaPyWorker.java against a real weka.jar and checks that running Weka
+# through the worker gives the same results as starting a JVM per call: training, testing (with
+# and without -distribution), piped data, updating an updateable model, micro-batched
+# predictions, retraining a model in place and rejecting a test set whose header does not match
+# the training data. Unlike run.py this needs a real JDK and weka.jar:
+#
+#   python benchmarks/worker_smoke.py --classpath /path/to/weka.jar
+#
+# The exit status is 1 if any check fails.
+
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from wekapy import Model, ProcessExecutor, WorkerExecutor, Feature, Instance
+from wekapy.ArffWriter import ArffWriter
+from wekapy.Executor import compile_worker
+from wekapy.LaunchProfile import effective_classpath
+from wekapy.Warmup import warmup_instances
+from wekapy.WekaPyException import WekaPyException
+import argparse
+import shutil
+import tempfile
+
+
+# Instances as warmup_instances(), with the colour attribute's values declared in another order.
+def reordered_instances(rows, seed):
+    for instance in warmup_instances(rows, seed):
+        yield Instance([Feature(feature.name, feature.value, "{blue,green,red}") if feature.name == "colour"
+                        else feature for feature in instance.features])
+
+
+# Instances as warmup_instances(), with every class label the other way round.
+def flipped_instances(rows, seed):
+    for instance in warmup_instances(rows, seed):
+        yield Instance([Feature("class", "no" if feature.value == "yes" else "yes", "{yes,no}")
+                        if feature.name == "class" else feature for feature in instance.features])
+
+
+def outcomes(predictions):
+    return [(p.predicted_value, round(p.probability, 3)) for p in predictions]
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name, passed):
+        print("{:<8} {}".format("ok" if passed else "FAILED", name))
+        if not passed:
+            self.failures += 1
+
+    def raises(self, name, run):
+        try:
+            run()
+        except WekaPyException as e:
+            self.check(name, "not compatible" in str(e))
+            return
+        self.check(name, False)
+
+
+def run_executor(label, executor, transport, args, work_dir, files, checks):
+    def model(classifier):
+        return Model(classifier, classpath=args.classpath, executor=executor, transport=transport,
+                     arff_dir=os.path.join(work_dir, "arff"), model_dir=os.path.join(work_dir, "models"))
+
+    results = {}
+    trained = model("bayes.NaiveBayesUpdateable")
+    trained.train(instances=list(warmup_instances(200, 1)), folds=2)
+    checks.check("{}: training evaluation".format(label), trained.evaluation is not None)
+    trained.test(test_file=files["test"])
+    results["test"] = outcomes(trained.predictions)
+    trained.test(test_file=files["test"], distribution=True)
+    results["distribution"] = [[round(p, 3) for p in trained.predictions.distribution(i)]
+                               for i in range(len(trained.predictions))]
+    trained.update(instances=list(warmup_instances(50, 2)))
+    trained.test(test_file=files["test"])
+    results["update"] = outcomes(trained.predictions)
+    results["batched"] = outcomes(trained.predict_many(list(warmup_instances(20, 3))))
+    checks.raises("{}: mismatched test header is rejected".format(label),
+                  lambda: trained.test(test_file=files["reordered"]))
+    trained.close()
+
+    # retrain to the same path: the worker must not answer from the model it cached before
+    model_file = os.path.join(work_dir, "{}-{}.model".format(label.split()[0], transport))
+    retrained = model("trees.J48")
+    retrained.train(training_file=files["train"], save_as=model_file, folds=2)
+    retrained.test(test_file=files["test"])
+    before = outcomes(retrained.predictions)
+    retrained.train(training_file=files["flipped"], save_as=model_file, folds=2)
+    retrained.test(test_file=files["test"])
+    checks.check("{}: retrained model is reloaded".format(label), outcomes(retrained.predictions) != before)
+    retrained.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check WekaPyWorker against a real Weka.")
+    parser.add_argument("--classpath", help="Weka's classpath (by default $CLASSPATH)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="wekapy-worker-")
+    checks = Checks()
+    try:
+        build_dir = compile_worker(effective_classpath(args.classpath), os.path.join(work_dir, "worker"))
+        checks.check("WekaPyWorker.java compiles", os.path.isdir(build_dir))
+        files = {}
+        for name, instances in [("train", warmup_instances(200, 1)), ("test", warmup_instances(50, 4)),
+                                ("reordered", reordered_instances(50, 4)), ("flipped", flipped_instances(200, 1))]:
+            files[name] = os.path.join(work_dir, name + ".arff")
+            with ArffWriter(files[name], name) as writer:
+                writer.write_instances(instances)
+
+        for transport in ["file", "pipe"]:
+            process_results = run_executor("process " + transport, ProcessExecutor(os.path.join(work_dir, "worker")),
+                                           transport, args, work_dir, files, checks)
+            with WorkerExecutor(build_root=os.path.join(work_dir, "worker")) as executor:
+                worker_results = run_executor("worker " + transport, executor, transport, args, work_dir, files,
+                                              checks)
+            for name in sorted(process_results):
+                checks.check("{} ({}): worker matches process".format(name, transport),
+                             worker_results[name] == process_results[name])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("\n{} check(s) failed.".format(checks.failures) if checks.failures else "\nAll checks passed.")
+    return 1 if checks.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
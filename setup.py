@@ -1,8 +1,10 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name = 'wekapy',
     packages = ['wekapy'],
+    package_data = {'wekapy': ['java/*.java']},
+    python_requires = '>=3.6',
     version = '1.3.6',
     description = 'Simple Python wrapper for the WEKA toolkit.',
     maintainer = 'Faiz Siddiqui',
@@ -0,0 +1,205 @@
+# ArffFile class
+#
+# Used externally, through read_arff(), to read an ARFF file in Python without starting a JVM.
+# The header is parsed into a schema of (name, possible_values) attributes, as used by Dataset
+# and SparseInstance, and the @data section is memory-mapped, so rows are only parsed when
+# they are read. Rows can be iterated lazily (as Instances, lists of values or Dataset chunks)
+# or accessed at random by row number; the byte offset of every row is indexed the first time
+# random access or len() is needed.
+# Dense, sparse ("{index value, ...}") and quoted values are supported. Gzip-compressed
+# (.arff.gz) files cannot be memory-mapped, so they are decompressed into memory instead.
+
+from wekapy.ArffReader import header_schema, parse_row
+from wekapy.Helpers import open_arff
+from wekapy.Dataset import Dataset, parse_possible_values, is_missing, NUMERIC
+from wekapy.Feature import Feature
+from wekapy.Instance import Instance
+from wekapy.SparseInstance import SparseInstance, zero_value
+from wekapy.WekaPyException import WekaPyException
+from array import array
+import gzip
+import mmap
+import os
+import re
+
+# a data line: anything but a blank line or a % comment
+DATA_LINE = re.compile(rb"^[ \t]*[^%\s].*$", re.MULTILINE)
+
+
+# Open an ARFF file for reading with an ArffFile.
+def read_arff(path):
+    return ArffFile(path)
+
+
+# The values left out of a sparse row for each attribute, as in Weka.
+def sparse_defaults(attributes):
+    defaults = []
+    for name, possible_values in attributes:
+        value = zero_value(possible_values)
+        defaults.append("" if value is None else str(value))
+    return defaults
+
+
+class ArffFile:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise WekaPyException("The ARFF file '{}' could not be found.".format(path))
+        self.path = path
+        self.file = None
+        if str(path).endswith(".gz"):
+            with gzip.open(path, "rb") as arff:
+                self.data = arff.read()
+        elif os.path.getsize(path) == 0:
+            self.data = b""
+        else:
+            self.file = open(path, "rb")
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = []
+        self.data_start = None
+        position = 0
+        while position < len(self.data):
+            end = self.data.find(b"\n", position)
+            end = len(self.data) if end < 0 else end + 1
+            line = self.data[position:end]
+            self.header.append(line.decode("utf-8"))
+            position = end
+            if line.strip().lower().startswith(b"@data"):
+                self.data_start = position
+                break
+        if self.data_start is None:
+            self.close()
+            raise WekaPyException("'{}' has no @data section.".format(path))
+        for line in self.header:
+            if line.strip().lower().startswith("@relation"):
+                self.relation = line.strip()[len("@relation"):].strip().strip("'\"")
+                break
+        else:
+            self.relation = None
+        self.attributes = header_schema(self.header)
+        self.kinds = [parse_possible_values(possible_values)[0] for name, possible_values in self.attributes]
+        self.defaults = sparse_defaults(self.attributes)
+        self.offsets = None
+
+    # Index the byte offset of every row, for len() and random access.
+    def index(self):
+        if self.offsets is None:
+            offsets = array("q")
+            offsets.extend(match.start() for match in DATA_LINE.finditer(self.data, self.data_start))
+            self.offsets = offsets
+        return self.offsets
+
+    def __len__(self):
+        return len(self.index())
+
+    # Count the rows, scanning the data section without indexing it unless it already is.
+    def count(self):
+        if self.offsets is not None:
+            return len(self.offsets)
+        return sum(1 for match in DATA_LINE.finditer(self.data, self.data_start))
+
+    def line(self, i):
+        offsets = self.index()
+        if i < 0:
+            i += len(offsets)
+        if not 0 <= i < len(offsets):
+            raise IndexError("ARFF row index out of range")
+        start = offsets[i]
+        end = self.data.find(b"\n", start)
+        return self.data[start:end if end >= 0 else len(self.data)].decode("utf-8")
+
+    # Yield the raw data lines from row start up to (not including) row stop.
+    def lines(self, start=0, stop=None):
+        if start == 0 and stop is None and self.offsets is None:
+            # scan straight through, without building the index
+            for match in DATA_LINE.finditer(self.data, self.data_start):
+                yield match.group().decode("utf-8")
+            return
+        offsets = self.index()
+        for i in range(*slice(start, stop).indices(len(offsets))):
+            yield self.line(i)
+
+    def parse(self, line):
+        values = parse_row(line, len(self.attributes), self.defaults)
+        if len(values) != len(self.attributes):
+            raise WekaPyException("A row of '{}' has {} values, but the header declares {} attributes.".format(
+                self.path, len(values), len(self.attributes)))
+        return values
+
+    # Return a row as a list of values: floats for numeric attributes, strings otherwise and "?"
+    # when missing.
+    def row(self, i):
+        return self.convert(self.parse(self.line(i)))
+
+    def rows(self, start=0, stop=None):
+        for line in self.lines(start, stop):
+            yield self.convert(self.parse(line))
+
+    def convert(self, values):
+        return [float(value) if kind == NUMERIC and not is_missing(value) else value
+                for kind, value in zip(self.kinds, values)]
+
+    # Return a row as an Instance, or as a SparseInstance if it is stored in sparse form.
+    def instance(self, i):
+        return self.make_instance(self.line(i))
+
+    def make_instance(self, line):
+        parsed = self.parse(line)
+        values = self.convert(parsed)
+        if line.lstrip().startswith("{"):
+            instance = SparseInstance(self.attributes)
+            for index, value in enumerate(values):
+                if parsed[index] != self.defaults[index]:
+                    instance.set_value(index, value)
+            return instance
+        return Instance([Feature(name, value, possible_values)
+                         for (name, possible_values), value in zip(self.attributes, values)])
+
+    def instances(self, start=0, stop=None):
+        for line in self.lines(start, stop):
+            yield self.make_instance(line)
+
+    def __iter__(self):
+        return self.instances()
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step not in (None, 1):
+                return [self.instance(i) for i in range(*item.indices(len(self)))]
+            return list(self.instances(item.start or 0, item.stop))
+        return self.instance(item)
+
+    # Yield the rows from start to stop as column-oriented Datasets of at most chunk_size rows.
+    def chunks(self, chunk_size=10000, start=0, stop=None):
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise WekaPyException("'chunk_size' argument must be a positive (int).")
+        dataset = Dataset(self.attributes)
+        for line in self.lines(start, stop):
+            dataset.append(self.parse(line))
+            if len(dataset) == chunk_size:
+                yield dataset
+                dataset = Dataset(self.attributes)
+        if len(dataset) > 0:
+            yield dataset
+
+    def to_dataset(self, start=0, stop=None):
+        return Dataset.from_rows(self.attributes, (self.parse(line) for line in self.lines(start, stop)))
+
+    # Write the header and rows start to stop to a new ARFF file, copying the rows unparsed.
+    def write_slice(self, output_file, start=0, stop=None):
+        with open_arff(output_file, "w") as output:
+            output.write("".join(self.header))
+            for line in self.lines(start, stop):
+                output.write(line.rstrip("\r") + "\n")
+        return output_file
+
+    def close(self):
+        if self.file is not None:
+            self.data.close()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,144 @@
+# ARFF reading helpers
+#
+# Used internally to read ARFF files without going through the JVM, for example to
+# shard a test set across several Weka processes.
+
+from wekapy.Helpers import open_arff
+
+UNESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+
+
+# Return True if a line from the @data section holds an instance (not blank or a comment).
+def is_data_line(line):
+    stripped = line.strip()
+    return len(stripped) > 0 and not stripped.startswith("%")
+
+
+# Read an ARFF header up to and including the @data line, leaving the file positioned at the
+# first data row. Returns the header lines exactly as read.
+def read_header(arff):
+    header = []
+    for line in iter(arff.readline, ""):
+        header.append(line)
+        if line.strip().lower().startswith("@data"):
+            return header
+    return header
+
+
+# Count the instances in an ARFF file.
+def count_rows(arff_file):
+    with open_arff(arff_file) as arff:
+        read_header(arff)
+        return sum(1 for line in arff if is_data_line(line))
+
+
+# Return the attribute names from a list of header lines.
+def header_attributes(header):
+    return [name for name, possible_values in header_schema(header)]
+
+
+# Return the (name, possible_values) attributes declared in a list of header lines, in the form
+# used by Dataset and SparseInstance, e.g. ("outlook", "{sunny,overcast,rainy}").
+def header_schema(header):
+    attributes = []
+    for line in header:
+        stripped = line.strip()
+        if stripped.lower().startswith("@attribute"):
+            declaration = stripped[len("@attribute"):].strip()
+            end = declaration_name_end(declaration)
+            name = split_values(declaration[:end], " \t")[0]
+            attributes.append((name, declaration[end:].strip()))
+    return attributes
+
+
+# Find where the (possibly quoted) attribute name ends in an attribute declaration.
+def declaration_name_end(declaration):
+    if declaration[:1] not in "'\"":
+        for i, char in enumerate(declaration):
+            if char in " \t{":
+                return i
+        return len(declaration)
+    i = 1
+    while i < len(declaration):
+        if declaration[i] == "\\":
+            i += 1
+        elif declaration[i] == declaration[0]:
+            return i + 1
+        i += 1
+    return len(declaration)
+
+
+# Split a comma-separated list of ARFF values (or space-separated, for declarations),
+# honouring single/double quotes and backslash escapes. Quotes are removed from the values.
+def split_values(text, separators=","):
+    values = []
+    value = []
+    quote = None
+    quoted = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote is not None:
+            if char == "\\" and i + 1 < len(text):
+                i += 1
+                value.append(UNESCAPES.get(text[i], text[i]))
+            elif char == quote:
+                quote = None
+            else:
+                value.append(char)
+        elif char in "'\"":
+            quote = char
+            quoted = True
+        elif char in separators:
+            if value or quoted or separators == ",":
+                values.append("".join(value) if quoted else "".join(value).strip())
+            value = []
+            quoted = False
+            if separators != ",":
+                # collapse runs of whitespace between declaration fields
+                while i + 1 < len(text) and text[i + 1] in separators:
+                    i += 1
+        elif char in " \t" and (quoted or not value):
+            pass  # whitespace around a quoted value, or leading whitespace
+        else:
+            value.append(char)
+        i += 1
+    if value or quoted or (separators == "," and values):
+        values.append("".join(value) if quoted else "".join(value).strip())
+    return values
+
+
+# Parse a dense or sparse ("{index value, ...}") data row into a list of string values.
+# Values left out of a sparse row are taken from defaults (one per attribute), or are "0".
+def parse_row(line, num_attributes, defaults=None):
+    line = line.strip()
+    if line.startswith("{") and line.endswith("}"):
+        values = list(defaults) if defaults is not None else ["0"] * num_attributes
+        for entry in split_values(line[1:-1]):
+            index, separator, value = entry.strip().partition(" ")
+            if index:
+                values[int(index)] = value.strip()
+        return values
+    if "'" not in line and '"' not in line:
+        return [value.strip() for value in line.split(",")]
+    return split_values(line)
+
+
+# Parse a single value of a data row. A dense row without quotes is only split as far as needed.
+def parse_value(line, index, num_attributes, defaults=None):
+    stripped = line.strip()
+    if not stripped.startswith("{") and "'" not in stripped and '"' not in stripped:
+        if index == num_attributes - 1:
+            return stripped.rsplit(",", 1)[-1].strip()
+        return stripped.split(",", index + 1)[index].strip()
+    return parse_row(line, num_attributes, defaults)[index]
+
+
+# Find the 0-based index of the class attribute from a Weka-style class column
+# ("first", "last" or a 1-based index).
+def class_index(class_column, num_attributes):
+    if str(class_column) == "first":
+        return 0
+    if str(class_column) == "last":
+        return num_attributes - 1
+    return int(class_column) - 1
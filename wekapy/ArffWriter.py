@@ -0,0 +1,236 @@
+# ArffWriter class
+#
+# Used internally by Model to write instances to an ARFF file.
+# Instances can come from a Dataset or any iterable (including generators). The header is
+# taken from the first instance, and rows are built with join() and written in batches, so
+# memory use stays flat however many rows are written.
+# By default, SparseInstances whose density (fraction of non-zero values) is below
+# sparse_threshold are written in Weka's sparse "{index value, ...}" form and other Instances as
+# dense rows. With sparse="auto" any row below the threshold is written in sparse form, and with
+# sparse=True or False every row is or none are.
+# ArffWriter.append() opens an existing ARFF file to add rows to it without rewriting it.
+# ArffStream writes instances to a stream it is called with, for passing them to Weka through a
+# pipe (an Executor's write_input) instead of a file.
+
+from wekapy.WekaPyException import WekaPyException
+from wekapy.Dataset import parse_possible_values, NUMERIC, NOMINAL, STRING
+from wekapy.SparseInstance import SparseInstance
+from wekapy.ArffReader import read_header, header_schema
+from wekapy.Dataset import Dataset
+from wekapy.Helpers import open_arff
+import re
+import time
+
+NEEDS_QUOTES = re.compile(r"[\s,'\"{}%\\]")
+ESCAPES = (("\\", "\\\\"), ("'", "\\'"), ("\n", "\\n"), ("\r", "\\r"), ("\t", "\\t"))
+
+
+# Quote a nominal/string value (or attribute name) if ARFF would otherwise misread it.
+def quote(value):
+    if value is None:
+        return "?"
+    value = str(value)
+    if value == "?":
+        return value
+    if value == "" or NEEDS_QUOTES.search(value):
+        for char, escaped in ESCAPES:
+            value = value.replace(char, escaped)
+        return "'" + value + "'"
+    return value
+
+
+def format_numeric(value):
+    if value is None:
+        return "?"
+    return str(value)
+
+
+def is_numeric(possible_values):
+    return parse_possible_values(possible_values)[0] == NUMERIC
+
+
+# The formatted values a sparse row can leave out for an attribute (0, or a nominal attribute's
+# first value). String values are never left out.
+def zero_values(possible_values):
+    kind, categories = parse_possible_values(possible_values)
+    if kind == NUMERIC:
+        return frozenset(["0", "0.0", "-0.0"])
+    if kind == NOMINAL and categories:
+        return frozenset([quote(categories[0])])
+    return frozenset()
+
+
+class ArffWriter:
+    # Pass an open file-like object as output to write to it instead of to path. A path ending in
+    # .gz is written gzip-compressed with the given compresslevel.
+    def __init__(self, path, relation, batch_size=1000, output=None, sparse=None, sparse_threshold=0.5,
+                 compresslevel=1, mode="w"):
+        if sparse is not None and sparse not in (True, False, "auto"):
+            raise WekaPyException("'sparse' argument must be None, True, False or \"auto\".")
+        self.path = path
+        self.relation = relation
+        self.batch_size = batch_size
+        self.sparse = sparse
+        self.sparse_threshold = sparse_threshold
+        self.attributes = None
+        self.formatters = None
+        self.zeros = None
+        self.strings = None
+        self.rows = 0
+        self.owns_output = output is None
+        self.output = output if output is not None else open_arff(path, mode, compresslevel)
+        if mode == "w":
+            self.output.write("@relation " + quote(relation) + "\n")
+
+    # Open an existing ARFF file for appending rows, taking the attributes from its header.
+    @classmethod
+    def append(cls, path, batch_size=1000, sparse=None, sparse_threshold=0.5, compresslevel=1):
+        with open_arff(path) as arff:
+            header = read_header(arff)
+        if not str(path).endswith(".gz"):
+            with open(path, "rb") as arff:
+                arff.seek(-1, 2)
+                ends_with_newline = arff.read(1) == b"\n"
+        else:
+            ends_with_newline = True  # checking would mean decompressing the whole file
+        writer = cls(path, None, batch_size, sparse=sparse, sparse_threshold=sparse_threshold,
+                     compresslevel=compresslevel, mode="a")
+        if not ends_with_newline:
+            writer.output.write("\n")
+        writer.set_attributes(header_schema(header))
+        return writer
+
+    # Set the (name, possible_values) attributes of the rows to write, without declaring them.
+    def set_attributes(self, attributes):
+        self.attributes = list(attributes)
+        self.formatters = [format_numeric if is_numeric(possible_values) else quote
+                           for name, possible_values in self.attributes]
+        self.zeros = [zero_values(possible_values) for name, possible_values in self.attributes]
+        self.strings = [i for i, (name, possible_values) in enumerate(self.attributes)
+                        if parse_possible_values(possible_values)[0] == STRING]
+
+    # Write the attribute declarations, given as (name, possible_values) pairs.
+    def write_header(self, attributes):
+        if self.attributes is not None:
+            raise WekaPyException("The ARFF header has already been written.")
+        self.set_attributes(attributes)
+        header = ["\t@attribute {} {}\n".format(quote(name), str(possible_values))
+                  for name, possible_values in self.attributes]
+        self.output.write("".join(header) + "\n@data\n")
+
+    # Write an iterable of Instances, taking the header from the first one if needed.
+    def write_instances(self, instances):
+        formatters = self.formatters
+        width = None if formatters is None else len(formatters)
+        batch = []
+        sparse = self.sparse
+        for instance in instances:
+            if isinstance(instance, SparseInstance) and sparse is not False:
+                if formatters is None:
+                    self.write_header(instance.attributes)
+                    formatters = self.formatters
+                    width = len(formatters)
+                if len(instance.attributes) != width:
+                    raise WekaPyException("Instance {} has {} attributes, but the ARFF header has {}.".format(
+                        self.rows + len(batch) + 1, len(instance.attributes), width))
+                if sparse is True or len(instance.sparse_features) < self.sparse_threshold * width:
+                    batch.append(self.sparse_row(dict((index, formatters[index](feature.value))
+                                                      for index, feature in instance.sparse_features.items())))
+                    if len(batch) >= self.batch_size:
+                        self.write_rows(batch)
+                        batch = []
+                    continue
+            features = instance.features
+            if formatters is None:
+                self.write_header([(feature.name, feature.possible_values) for feature in features])
+                formatters = self.formatters
+                width = len(formatters)
+            if len(features) != width:
+                raise WekaPyException("Instance {} has {} features, but the ARFF header has {}.".format(
+                    self.rows + len(batch) + 1, len(features), width))
+            values = [format_value(feature.value) for format_value, feature in zip(formatters, features)]
+            if sparse is True or sparse == "auto" and width - sum(
+                    1 for value, zeros in zip(values, self.zeros) if value in zeros) < self.sparse_threshold * width:
+                batch.append(self.sparse_row(dict(enumerate(values))))
+            else:
+                batch.append(",".join(values))
+            if len(batch) >= self.batch_size:
+                self.write_rows(batch)
+                batch = []
+        if batch:
+            self.write_rows(batch)
+        return self.rows
+
+    # Write a Dataset column-wise, one batch of rows at a time.
+    def write_dataset(self, dataset):
+        if self.attributes is None:
+            self.write_header(dataset.attributes)
+        elif [name for name, values in self.attributes] != [name for name, values in dataset.attributes]:
+            raise WekaPyException("The Dataset's attributes do not match the ARFF header.")
+        columns = []
+        for j, kind in enumerate(dataset.kinds):
+            if kind == NOMINAL:
+                # code -1 (missing) picks the trailing "?"
+                labels = [quote(value) for value in dataset.categories[j]] + ["?"]
+                columns.append(lambda column, start, end, labels=labels: [labels[code] for code in column[start:end]])
+            elif kind == NUMERIC:
+                columns.append(lambda column, start, end: ["?" if value != value else repr(value)
+                                                           for value in column[start:end]])
+            else:
+                columns.append(lambda column, start, end: [quote(value) for value in column[start:end]])
+        for start in range(0, len(dataset), self.batch_size):
+            end = min(start + self.batch_size, len(dataset))
+            formatted = [format_column(column, start, end) for format_column, column in zip(columns, dataset.columns)]
+            self.write_rows([",".join(row) for row in zip(*formatted)])
+        return self.rows
+
+    # Format a row from its formatted non-zero values, keyed by attribute index. Missing string
+    # values are written out explicitly, since a left-out string is not missing in Weka.
+    def sparse_row(self, values):
+        for index in self.strings:
+            if index not in values:
+                values[index] = "?"
+        return "{" + ",".join("{} {}".format(index, values[index]) for index in sorted(values)
+                              if values[index] not in self.zeros[index]) + "}"
+
+    def write_rows(self, rows):
+        self.output.write("\n".join(rows) + "\n")
+        self.rows += len(rows)
+
+    def close(self):
+        if self.owns_output:
+            self.output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ArffStream:
+    # attributes, if given, are declared in the header instead of taking them from the first
+    # instance. If a Metrics object is given, the time spent writing and the rows written are
+    # recorded in it.
+    def __init__(self, instances, relation, sparse=None, attributes=None, metrics=None):
+        self.instances = instances
+        self.relation = relation
+        self.sparse = sparse
+        self.attributes = attributes
+        self.metrics = metrics
+        self.rows = 0
+
+    def __call__(self, output):
+        start_time = time.time()
+        writer = ArffWriter(None, self.relation, sparse=self.sparse, output=output)
+        if self.attributes is not None:
+            writer.write_header(self.attributes)
+        if isinstance(self.instances, Dataset):
+            writer.write_dataset(self.instances)
+        else:
+            writer.write_instances(self.instances)
+        self.attributes = writer.attributes
+        self.rows = writer.rows
+        if self.metrics is not None:
+            self.metrics.add_phase("arff", time.time() - start_time)
+            self.metrics.add_rows(rows_in=writer.rows)
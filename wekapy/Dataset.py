@@ -0,0 +1,165 @@
+# Dataset class
+#
+# Used internally and externally as a compact, column-oriented alternative to a list of Instances.
+# A Dataset holds a single schema of (name, possible_values) attributes, shared by every row,
+# and stores each column in an array: numeric values as doubles (NaN when missing), nominal
+# values as small integer codes into the attribute's list of values (-1 when missing) and
+# string values as a plain list.
+# Datasets can be passed anywhere a list of Instances is accepted (Model.train, Model.test, ...).
+
+from wekapy.WekaPyException import WekaPyException
+from wekapy.ArffReader import split_values
+from wekapy.Feature import Feature
+from wekapy.Instance import Instance
+from array import array
+import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NUMERIC = "numeric"
+NOMINAL = "nominal"
+STRING = "string"
+
+
+# Work out the kind of an attribute and, for nominal attributes, its list of values.
+def parse_possible_values(possible_values):
+    spec = str(possible_values).strip()
+    if spec.startswith("{") and spec.endswith("}"):
+        return NOMINAL, split_values(spec[1:-1])  # quoted values may hold commas
+    if spec.lower() in ("numeric", "real", "integer"):
+        return NUMERIC, None
+    return STRING, None
+
+
+def is_missing(value):
+    return value is None or value == "?" or (isinstance(value, float) and math.isnan(value))
+
+
+class Dataset:
+    def __init__(self, attributes):
+        self.attributes = [(str(name), str(possible_values)) for name, possible_values in attributes]
+        if len(self.attributes) == 0:
+            raise WekaPyException("A Dataset needs at least one attribute.")
+        self.kinds = []
+        self.categories = []
+        self.category_codes = []
+        self.columns = []
+        for name, possible_values in self.attributes:
+            kind, categories = parse_possible_values(possible_values)
+            self.kinds.append(kind)
+            self.categories.append(categories)
+            if kind == NOMINAL:
+                self.category_codes.append(dict((value, code) for code, value in enumerate(categories)))
+                self.columns.append(array("h" if len(categories) < 32767 else "i"))
+            else:
+                self.category_codes.append(None)
+                self.columns.append(array("d") if kind == NUMERIC else [])
+        self.length = 0
+
+    @classmethod
+    def from_rows(cls, attributes, rows):
+        dataset = cls(attributes)
+        dataset.extend(rows)
+        return dataset
+
+    # Build a Dataset from Instances, taking the schema from the first one.
+    @classmethod
+    def from_instances(cls, instances):
+        dataset = None
+        for instance in instances:
+            if dataset is None:
+                dataset = cls([(feature.name, feature.possible_values) for feature in instance.features])
+            dataset.append([feature.value for feature in instance.features])
+        if dataset is None:
+            raise WekaPyException("Cannot build a Dataset from an empty list of instances.")
+        return dataset
+
+    # Build a Dataset from a 2-D NumPy array with one column per attribute. Nominal columns may
+    # hold either the nominal values themselves or their integer codes.
+    @classmethod
+    def from_numpy(cls, attributes, data):
+        if numpy is None:
+            raise WekaPyException("NumPy is required for Dataset.from_numpy().")
+        data = numpy.asarray(data)
+        dataset = cls(attributes)
+        if data.ndim != 2 or data.shape[1] != len(dataset.attributes):
+            raise WekaPyException("'data' must be a 2-D array with one column per attribute.")
+        for j, kind in enumerate(dataset.kinds):
+            column = data[:, j]
+            if kind == NUMERIC:
+                dataset.columns[j].frombytes(numpy.ascontiguousarray(column, dtype=numpy.float64).tobytes())
+            elif kind == NOMINAL and column.dtype.kind in "iuf":
+                codes = numpy.where(numpy.isnan(column.astype(numpy.float64)), -1, column).astype(numpy.int64)
+                if codes.size and (codes.min() < -1 or codes.max() >= len(dataset.categories[j])):
+                    raise WekaPyException("Column {} holds codes outside its nominal values.".format(j + 1))
+                dataset.columns[j].extend(codes.tolist())
+            elif kind == NOMINAL:
+                dataset.columns[j].extend([dataset.encode(j, value) for value in column.tolist()])
+            else:
+                dataset.columns[j].extend([None if is_missing(value) else str(value) for value in column.tolist()])
+        dataset.length = data.shape[0]
+        return dataset
+
+    def encode(self, j, value):
+        if is_missing(value):
+            return -1
+        try:
+            return self.category_codes[j][str(value)]
+        except KeyError:
+            raise WekaPyException("'{}' is not a possible value of attribute '{}'.".format(
+                value, self.attributes[j][0]))
+
+    def append(self, row):
+        if len(row) != len(self.columns):
+            raise WekaPyException("Row has {} values, but the Dataset has {} attributes.".format(
+                len(row), len(self.columns)))
+        for j, value in enumerate(row):
+            kind = self.kinds[j]
+            if kind == NUMERIC:
+                self.columns[j].append(float("nan") if is_missing(value) else float(value))
+            elif kind == NOMINAL:
+                self.columns[j].append(self.encode(j, value))
+            else:
+                self.columns[j].append(None if is_missing(value) else str(value))
+        self.length += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return self.length
+
+    # Return the decoded values of a row, using None for missing values.
+    def row(self, i):
+        values = []
+        for j, kind in enumerate(self.kinds):
+            value = self.columns[j][i]
+            if kind == NUMERIC:
+                value = None if math.isnan(value) else value
+            elif kind == NOMINAL:
+                value = None if value < 0 else self.categories[j][value]
+            values.append(value)
+        return values
+
+    # Return a row as an Instance, for code written against lists of Instances.
+    def instance(self, i):
+        return Instance([Feature(name, "?" if value is None else value, possible_values)
+                         for (name, possible_values), value in zip(self.attributes, self.row(i))])
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self.instance(i)
+
+    # Return a column by attribute name. When NumPy is available, numeric and nominal columns are
+    # returned as NumPy views sharing the Dataset's memory (no copy is made).
+    def column(self, name):
+        for j, (attribute, possible_values) in enumerate(self.attributes):
+            if attribute == name:
+                column = self.columns[j]
+                if numpy is not None and isinstance(column, array):
+                    return numpy.frombuffer(column, dtype=numpy.float64 if column.typecode == "d" else column.typecode)
+                return column
+        raise WekaPyException("The Dataset has no attribute named '{}'.".format(name))
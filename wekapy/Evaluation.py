@@ -0,0 +1,120 @@
+# Evaluation class
+#
+# Used internally and externally to represent the summary statistics Weka prints after
+# training a classifier (e.g. its cross-validation accuracy, kappa and per-class metrics).
+# Model.train() parses its output into an Evaluation, available as model.evaluation.
+
+import re
+
+SECTION = re.compile(r"^=== (.*) ===\s*$")
+SUMMARY_FIELDS = {
+    "Correctly Classified Instances": "correct",
+    "Incorrectly Classified Instances": "incorrect",
+    "Kappa statistic": "kappa",
+    "Mean absolute error": "mean_absolute_error",
+    "Root mean squared error": "root_mean_squared_error",
+    "Relative absolute error": "relative_absolute_error",
+    "Root relative squared error": "root_relative_squared_error",
+    "Total Number of Instances": "total_instances",
+}
+
+
+def to_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class Evaluation:
+    def __init__(self, section=None):
+        self.section = section
+        self.correct = None
+        self.incorrect = None
+        self.accuracy = None
+        self.kappa = None
+        self.mean_absolute_error = None
+        self.root_mean_squared_error = None
+        self.relative_absolute_error = None
+        self.root_relative_squared_error = None
+        self.total_instances = None
+        self.class_details = []
+        self.weighted_average = None
+
+    def __str__(self):
+        return "{}:\taccuracy: {}%\tkappa: {}".format(str(self.section), str(self.accuracy), str(self.kappa))
+
+
+# Split Weka's output into its "=== Title ===" sections.
+def split_sections(output):
+    sections = []
+    title = None
+    lines = []
+    for line in output.split("\n"):
+        match = SECTION.match(line.strip())
+        if match:
+            if title is not None:
+                sections.append((title, lines))
+            title = match.group(1)
+            lines = []
+        elif title is not None:
+            lines.append(line)
+    if title is not None:
+        sections.append((title, lines))
+    return sections
+
+
+def parse_summary(evaluation, lines):
+    for line in lines:
+        for label, field in SUMMARY_FIELDS.items():
+            if line.startswith(label):
+                values = line[len(label):].split()
+                if len(values) == 0:
+                    continue
+                setattr(evaluation, field, to_number(values[0]))
+                if field == "correct" and len(values) > 1:
+                    evaluation.accuracy = to_number(values[1])
+
+
+# Parse the "Detailed Accuracy By Class" table, whose columns vary between Weka versions.
+def parse_class_details(evaluation, lines):
+    columns = None
+    for line in lines:
+        if not line.strip():
+            continue
+        if columns is None:
+            columns = [column.lower().replace(" ", "_").replace("-", "_")
+                       for column in re.split(r"\s{2,}", line.strip())]
+            continue
+        weighted = line.strip().startswith("Weighted Avg.")
+        values = line.strip()[len("Weighted Avg."):].split() if weighted else line.split()
+        metrics = dict((column, to_number(value)) for column, value in zip(columns[:-1], values))
+        if weighted:
+            evaluation.weighted_average = metrics
+        else:
+            metrics["class"] = " ".join(values[len(columns) - 1:])
+            evaluation.class_details.append(metrics)
+
+
+def is_result_section(title):
+    title = title.lower()
+    return "cross-validation" in title or title.startswith("error on")
+
+
+# Parse Weka's training output, preferring the cross-validation results to the error on the
+# training data. Returns None if the output holds no summary.
+def parse_evaluation(output):
+    sections = split_sections(output)
+    results = [i for i, (title, lines) in enumerate(sections) if is_result_section(title)]
+    if len(results) == 0:
+        return None
+    cross_validation = [i for i in results if "cross-validation" in sections[i][0].lower()]
+    chosen = cross_validation[-1] if cross_validation else results[-1]
+    evaluation = Evaluation(sections[chosen][0])
+    parse_summary(evaluation, sections[chosen][1])
+    for title, lines in sections[chosen + 1:]:
+        if is_result_section(title):
+            break
+        if title == "Detailed Accuracy By Class":
+            parse_class_details(evaluation, lines)
+    return evaluation
@@ -0,0 +1,260 @@
+# Executor classes
+#
+# Used internally by Model and Filter to run Weka command lines.
+# ProcessExecutor starts a new JVM for every call (the default behaviour). WorkerExecutor
+# keeps resident Weka JVMs running and sends each command to them over a stdin/stdout
+# protocol, so loaded classes and deserialized models stay in memory between calls.
+# A WorkerExecutor can be given to a single Model/Filter or shared between several.
+# Commands for the worker's own pseudo main classes ("wekapy.predict", "wekapy.train", ...) also
+# work with a ProcessExecutor, which runs the worker class once in a new JVM for them.
+# Commands can be given a write_input function, which is called with a text stream to write the
+# data of a "-" data location to while the command runs: the JVM's stdin with a ProcessExecutor,
+# or the request stream with a WorkerExecutor. Nothing is written to disk.
+
+from wekapy.Helpers import run_process, run_process_async, stream_process, check_error
+from wekapy.Metrics import process_usage
+from wekapy.WekaPyException import WekaPyException
+import asyncio
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+WORKER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "java", "WekaPyWorker.java")
+WORKER_CLASS = "WekaPyWorker"
+WORKER_PREFIX = "wekapy."
+
+
+class Executor:
+    # Run a full java command line, returning (stdout, time taken). If a Metrics object is given,
+    # the JVM's resource usage is recorded in it.
+    def run(self, options, metrics=None, write_input=None):
+        raise NotImplementedError
+
+    # Run a full java command line, yielding lines of stdout as they become available.
+    def stream(self, options, metrics=None, write_input=None):
+        process_output, time_taken = self.run(options, metrics, write_input)
+        for line in process_output.split("\n"):
+            yield line
+
+    # Run a full java command line from a coroutine. By default run() is called in a thread.
+    async def arun(self, options, metrics=None, write_input=None):
+        return await asyncio.get_event_loop().run_in_executor(None, self.run, options, metrics, write_input)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ProcessExecutor(Executor):
+    def __init__(self, build_root="wekapy_data/worker"):
+        self.build_root = build_root
+
+    # Run the worker class once for its pseudo main classes, and Weka directly otherwise.
+    def command(self, options):
+        jvm_options, args = split_java_command(options)
+        if args and args[0].startswith(WORKER_PREFIX):
+            return worker_command(jvm_options, self.build_root) + args
+        return options
+
+    def run(self, options, metrics=None, write_input=None):
+        return run_process(self.command(options), metrics, write_input)
+
+    def stream(self, options, metrics=None, write_input=None):
+        return stream_process(self.command(options), metrics, write_input)
+
+    async def arun(self, options, metrics=None, write_input=None):
+        return await run_process_async(self.command(options), metrics, write_input)
+
+
+# Split a java command line into the JVM options and the Weka main class with its arguments.
+def split_java_command(options):
+    i = 1
+    while i < len(options) and options[i].startswith("-"):
+        if options[i] in ("-cp", "-classpath", "--class-path"):
+            i += 1
+        i += 1
+    return options[1:i], options[i:]
+
+
+# Compile the worker class against the given classpath, if it has not been compiled already.
+def compile_worker(classpath, build_root="wekapy_data/worker"):
+    with open(WORKER_SOURCE, "rb") as source:
+        digest = hashlib.sha1(source.read()).hexdigest()[:12]
+    build_dir = os.path.join(build_root, digest)
+    if os.path.exists(os.path.join(build_dir, WORKER_CLASS + ".class")):
+        return build_dir
+    if not os.path.exists(build_root):
+        os.makedirs(build_root)
+    scratch_dir = tempfile.mkdtemp(dir=build_root)
+    process = subprocess.Popen(["javac", "-cp", classpath, "-d", scratch_dir, WORKER_SOURCE],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process_output, process_error = process.communicate()
+    if process.returncode != 0:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        raise WekaPyException("Could not compile the Weka worker: {}".format(process_error.decode('utf-8').strip()))
+    try:
+        os.rename(scratch_dir, build_dir)
+    except OSError:  # compiled concurrently by another process
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return build_dir
+
+
+# Build the java command line that runs the worker class, compiling it if needed.
+def worker_command(jvm_options, build_root="wekapy_data/worker"):
+    options = list(jvm_options)
+    classpath = None
+    for flag in ("-cp", "-classpath", "--class-path"):
+        if flag in options:
+            i = options.index(flag)
+            classpath = options[i + 1]
+            del options[i:i + 2]
+    if classpath is None:
+        classpath = os.environ.get("CLASSPATH", ".")
+    build_dir = compile_worker(classpath, build_root)
+    # the worker's classes go last, so Weka's classpath stays a prefix of the JVM's and a class
+    # data sharing archive built for it (see LaunchProfile) can still be used
+    return ["java"] + options + ["-cp", os.pathsep.join([classpath, build_dir]), WORKER_CLASS]
+
+
+# A single resident JVM running WekaPyWorker.
+class Worker:
+    def __init__(self, jvm_options, build_root="wekapy_data/worker"):
+        self.jvm_options = list(jvm_options)
+        self.build_root = build_root
+        self.process = None
+        self.requests = 0
+
+    def command(self):
+        return worker_command(self.jvm_options, self.build_root)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.stop()
+        self.process = subprocess.Popen(self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        if self.process.stdout.readline().strip() != b"WEKAPY READY":
+            self.stop()
+            raise WekaPyException("The Weka worker failed to start.")
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    # Send one Weka command to the JVM and return its (stdout, stderr). If a Metrics object is
+    # given, the CPU time the request used is recorded in it, with the JVM's peak memory so far.
+    # If write_input is given, the data it writes follows the command in the request stream.
+    def request(self, args, metrics=None, write_input=None):
+        if any("\n" in arg for arg in args):
+            raise WekaPyException("Arguments passed to the Weka worker cannot contain newlines.")
+        if not self.alive():
+            self.start()
+        peak_rss, cpu_before = process_usage(self.process.pid) if metrics is not None else (None, None)
+        message = "{}\n{}\n".format(len(args), "\n".join(args)).encode('utf-8')
+        input_error = None
+        try:
+            self.process.stdin.write(message)
+            if write_input is not None:
+                data = RequestData(self.process.stdin)
+                try:
+                    write_input(data)
+                except (IOError, OSError):
+                    raise
+                except Exception as error:
+                    # end the data anyway, so the worker can answer this request and stay usable
+                    input_error = error
+                data.close()
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if len(header) != 4 or header[0] != b"WEKAPY":
+                raise IOError("unexpected response")
+            output = self.process.stdout.read(int(header[2]))
+            error = self.process.stdout.read(int(header[3]))
+        except (IOError, OSError, ValueError):
+            # The JVM died mid-request (e.g. out of memory or System.exit()); the next request restarts it.
+            self.stop()
+            raise WekaPyException("The Weka worker exited unexpectedly while running {}.".format(args[0]))
+        self.requests += 1
+        if metrics is not None:
+            peak_rss, cpu_after = process_usage(self.process.pid)
+            metrics.add_process(peak_rss, None if cpu_before is None or cpu_after is None else cpu_after - cpu_before)
+        if input_error is not None:
+            raise input_error
+        return output.decode('utf-8').strip(), error.decode('utf-8').strip()
+
+
+# A write-only text stream sending a request's data to a worker: each line is prefixed with a
+# space, and the data is ended by a line that is not.
+class RequestData:
+    def __init__(self, stream):
+        self.stream = stream
+        self.stream.write(b" ")
+
+    def write(self, text):
+        self.stream.write(text.replace("\n", "\n ").encode('utf-8'))
+
+    def close(self):
+        self.stream.write(b"\nEND\n")
+
+
+class WorkerExecutor(Executor):
+    def __init__(self, pool_size=1, build_root="wekapy_data/worker"):
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise WekaPyException("'pool_size' argument must be a positive (int).")
+        self.pool_size = pool_size
+        self.build_root = build_root
+        self.pools = {}
+        self.workers = []
+        self.lock = threading.Lock()
+
+    # Take an idle worker started with these JVM options, starting a new one if the pool has room.
+    def acquire(self, jvm_options):
+        key = tuple(jvm_options)
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = [queue.Queue(), 0]
+            pool = self.pools[key]
+            if pool[0].empty() and pool[1] < self.pool_size:
+                pool[1] += 1
+                worker = Worker(jvm_options, self.build_root)
+                self.workers.append(worker)
+                return worker
+        return pool[0].get()
+
+    def release(self, jvm_options, worker):
+        self.pools[tuple(jvm_options)][0].put(worker)
+
+    def run(self, options, metrics=None, write_input=None):
+        jvm_options, args = split_java_command(options)
+        start_time = time.time()
+        worker = self.acquire(jvm_options)
+        try:
+            process_output, process_error = worker.request(args, metrics, write_input)
+        finally:
+            self.release(jvm_options, worker)
+        check_error(process_error)
+        return process_output, time.time() - start_time
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            self.pools = {}
@@ -0,0 +1,111 @@
+# Experiment class
+#
+# Used externally to compare classifiers. An Experiment takes a grid of classifier types,
+# classifier options, training ARFF files and cross-validation folds, trains a Model for
+# every combination in a pool of concurrent JVMs and ranks the parsed cross-validation
+# results.
+# max_memory is the total heap budget for the whole Experiment and is shared between the
+# concurrent runs.
+
+from wekapy.Model import Model, MIN_JVM_MEMORY
+from wekapy.WekaPyException import WekaPyException
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+
+
+class ExperimentResult:
+    def __init__(self, classifier, options, dataset, folds):
+        self.classifier = classifier
+        self.options = options
+        self.dataset = dataset
+        self.folds = folds
+        self.evaluation = None
+        self.model_file = None
+        self.time_taken = 0.0
+        self.error = None
+
+    # Look up a summary statistic (e.g. "accuracy", "kappa") from the evaluation.
+    def metric(self, name):
+        if self.evaluation is None:
+            return None
+        return getattr(self.evaluation, name, None)
+
+    def __str__(self):
+        return "{} {}\t{}\tfolds: {}\taccuracy: {}\tkappa: {}".format(
+            self.classifier, " ".join(self.options), self.dataset, str(self.folds),
+            str(self.metric("accuracy")), str(self.metric("kappa")))
+
+
+class Experiment:
+    def __init__(self, classifiers=None, datasets=None, options=None, folds=10, workers=1, max_memory=1500,
+                 classpath=None, verbose=False, executor=None, profile=None):
+        if not classifiers:
+            raise WekaPyException("At least one classifier type is required.")
+        if not datasets:
+            raise WekaPyException("At least one training ARFF file is required.")
+        if not isinstance(workers, int) or workers < 1:
+            raise WekaPyException("'workers' argument must be a positive (int).")
+        if not isinstance(max_memory, int):
+            raise WekaPyException("'max_memory' argument must be of type (int).")
+        self.classifiers = [classifiers] if isinstance(classifiers, str) else list(classifiers)
+        self.datasets = [datasets] if isinstance(datasets, str) else list(datasets)
+        # options maps a classifier type to a list of option lists to try, e.g.
+        # {"trees.J48": [["-C", "0.1"], ["-C", "0.25"]]}
+        self.options = options if options is not None else {}
+        self.folds = [folds] if isinstance(folds, int) else list(folds)
+        self.workers = workers
+        self.max_memory = max_memory
+        self.classpath = classpath
+        self.verbose = verbose
+        self.executor = executor
+        self.profile = profile
+        self.results = []
+
+    # Every (classifier, options, dataset, folds) combination in the grid.
+    def runs(self):
+        grid = []
+        for classifier in self.classifiers:
+            option_sets = self.options.get(classifier) or [[]]
+            for options, dataset, folds in itertools.product(option_sets, self.datasets, self.folds):
+                grid.append(ExperimentResult(classifier, list(options), dataset, folds))
+        return grid
+
+    def train(self, result, max_memory):
+        model = Model(classifier_type=result.classifier, max_memory=max_memory, classpath=self.classpath,
+                      executor=self.executor, options=result.options, profile=self.profile)
+        try:
+            model.train(training_file=result.dataset, folds=result.folds)
+        except WekaPyException as e:
+            result.error = str(e)
+        result.evaluation = model.evaluation
+        result.model_file = model.model_file
+        result.time_taken = model.time_taken
+        if self.verbose:
+            print(result if result.error is None else "{}\terror: {}".format(str(result), result.error))
+        return result
+
+    # Run every combination and return the results ranked by rank_by (best first). Runs
+    # that failed or have no value for rank_by are listed last.
+    def run(self, rank_by="accuracy", descending=True):
+        grid = self.runs()
+        workers = max(1, min(self.workers, len(grid), self.max_memory // MIN_JVM_MEMORY))
+        max_memory = self.max_memory // workers
+        if self.verbose:
+            print("Running {} experiments with {} workers ({}MB each)...".format(len(grid), workers, max_memory))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda result: self.train(result, max_memory), grid))
+        ranked = [result for result in results if result.metric(rank_by) is not None]
+        ranked.sort(key=lambda result: result.metric(rank_by), reverse=descending)
+        self.results = ranked + [result for result in results if result.metric(rank_by) is None]
+        return self.results
+
+    # Format the ranked results as a plain-text table.
+    def table(self):
+        rows = [["rank", "classifier", "options", "dataset", "folds", "accuracy", "kappa", "time"]]
+        for rank, result in enumerate(self.results):
+            rows.append([str(rank + 1), result.classifier, " ".join(result.options), result.dataset,
+                         str(result.folds), str(result.metric("accuracy")), str(result.metric("kappa")),
+                         "{:.2f}s".format(result.time_taken) if result.error is None else "error"])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+                         for row in rows)
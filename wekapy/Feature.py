@@ -7,6 +7,8 @@
 
 
 class Feature:
+    __slots__ = ("name", "value", "possible_values")
+
     def __init__(self, name=None, value=None, possible_values=None):
         self.name = name
         self.value = value
@@ -1,74 +1,296 @@
 # Filter class
 #
 # Used to filter/pre-process data using one of the weka.filters classes.
+# With compress=True (or a gzip level from 1 to 9), output ARFF files are written gzip-compressed
+# as .arff.gz, which Weka reads natively.
+# After each operation, self.metrics holds a Metrics object describing it (see Model).
+# JVMs are started with the flags of the LaunchProfile given as profile (see Model).
 
-from wekapy.Helpers import run_process
+from wekapy.Helpers import java_command, arff_base, open_arff, compress_file
+from wekapy.ArffReader import parse_value, class_index
+from wekapy.ArffFile import read_arff
+from wekapy.Executor import ProcessExecutor
+from wekapy.Metrics import Metrics
+from wekapy.LaunchProfile import get_profile
 from wekapy.WekaPyException import WekaPyException
+from array import array
+import math
+import os
 import uuid
 import random
+import time
 
 
 class Filter:
-    def __init__(self, max_memory=1500, classpath=None, verbose=False):
+    def __init__(self, max_memory=1500, classpath=None, verbose=False, executor=None, compress=False, profile=None):
         if not isinstance(max_memory, int):
             raise WekaPyException("'max_memory' argument must be of type (int).")
+        if not isinstance(compress, bool) and compress not in range(1, 10):
+            raise WekaPyException("'compress' argument must be a (bool) or a gzip level from 1 to 9.")
+        get_profile(profile)  # raises for an unknown profile
+        self.compress = compress
+        self.profile = profile
         self.classpath = classpath
         self.max_memory = max_memory
         self.id = uuid.uuid4()
         self.verbose = verbose
+        self.executor = executor if executor is not None else ProcessExecutor()
+        self.metrics = None
+        self.hooks = []
 
-    def filter(self, filter_options=None, input_file_name=None, output_file=None, class_column="last"):
+    # Build the Weka command for filtering an input file, returning it with the output file name
+    def filter_command(self, filter_options=None, input_file_name=None, output_file=None, class_column="last"):
         if filter_options is None:
             raise WekaPyException("A filter type is required")
         if input_file_name is None:
             raise WekaPyException("An input file is needed for filtering")
         if output_file is None:
-            output_file = "{}-filtered.arff".format(str(input_file_name.rstrip(".arff")))
+            output_file = "{}-filtered{}".format(arff_base(input_file_name), self.extension())
+        options = java_command(self.max_memory, self.classpath, self.profile)
+        options.extend(filter_options)
+        options.extend(["-i", input_file_name, "-o", self.weka_output(output_file), "-c", class_column])
+        return options, output_file
+
+    # Call a function with the Metrics of each of this Filter's operations once it has finished.
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def start_metrics(self, operation, input_files):
+        self.metrics = Metrics(operation, self.hooks)
+        for input_file in input_files:
+            if os.path.exists(input_file):
+                self.metrics.add_bytes(bytes_in=os.path.getsize(input_file))
+        return self.metrics
+
+    def finish_metrics(self, output_files):
+        for output_file in output_files:
+            if os.path.exists(output_file):
+                self.metrics.add_bytes(bytes_out=os.path.getsize(output_file))
+        self.metrics.finish()
+
+    def extension(self):
+        return ".arff.gz" if self.compress else ".arff"
+
+    def compresslevel(self):
+        return 1 if isinstance(self.compress, bool) else self.compress
+
+    # Weka's filters always write plain ARFF, so a .gz output is written uncompressed first.
+    def weka_output(self, output_file):
+        return output_file[:-len(".gz")] if output_file.endswith(".gz") else output_file
+
+    # Compress Weka's output into the requested .gz file.
+    def finish_output(self, output_file):
+        if output_file.endswith(".gz"):
+            with self.metrics.phase("compress"):
+                compress_file(self.weka_output(output_file), output_file, self.compresslevel())
+
+    def filter(self, filter_options=None, input_file_name=None, output_file=None, class_column="last"):
+        options, output_file = self.filter_command(filter_options, input_file_name, output_file, class_column)
         if self.verbose:
             print("Filtering input data...")
-        options = ["java", "-Xmx{}M".format(str(self.max_memory))]
-        if self.classpath is not None:
-            options.extend(["-cp", self.classpath])
-        options.extend(filter_options)
-        options.extend(["-i", input_file_name, "-o", output_file, "-c", class_column])
-        process_output, run_time = run_process(options)
+        metrics = self.start_metrics("filter", [input_file_name])
+        with metrics.phase("process"):
+            process_output, run_time = self.executor.run(options, metrics)
+        self.finish_output(output_file)
+        self.finish_metrics([output_file])
         if self.verbose:
             print("Filtering complete (time taken = {:.2f}s)".format(run_time))
         return output_file
 
-    def split(self, input_file_name=None, training_percentage=67, randomise=True, seed=None):
+    # Filter an input file as filter() does, from a coroutine. The JVM is run as an asyncio
+    # subprocess, which is killed if the coroutine is cancelled. If a MemoryLimiter is given,
+    # this waits until it has room for another max_memory JVM.
+    async def afilter(self, filter_options=None, input_file_name=None, output_file=None, class_column="last",
+                      limiter=None):
+        options, output_file = self.filter_command(filter_options, input_file_name, output_file, class_column)
+        if self.verbose:
+            print("Filtering input data...")
+        metrics = self.start_metrics("filter", [input_file_name])
+        with metrics.phase("process"):
+            if limiter is None:
+                process_output, run_time = await self.executor.arun(options, metrics)
+            else:
+                async with limiter.reserve(self.max_memory):
+                    process_output, run_time = await self.executor.arun(options, metrics)
+        self.finish_output(output_file)
+        self.finish_metrics([output_file])
+        if self.verbose:
+            print("Filtering complete (time taken = {:.2f}s)".format(run_time))
+        return output_file
+
+    # Fit a filter on the training file and apply the same fitted filter to the test file, in one
+    # JVM (Weka's batch mode), so both get identical preprocessing.
+    def batch_filter(self, filter_options=None, training_file=None, test_file=None, training_output=None,
+                     test_output=None, class_column="last"):
+        if filter_options is None:
+            raise WekaPyException("A filter type is required")
+        if training_file is None or test_file is None:
+            raise WekaPyException("Training and test input files are needed for batch filtering")
+        if training_output is None:
+            training_output = "{}-filtered{}".format(arff_base(training_file), self.extension())
+        if test_output is None:
+            test_output = "{}-filtered{}".format(arff_base(test_file), self.extension())
+        if self.verbose:
+            print("Filtering training and test data...")
+        options = java_command(self.max_memory, self.classpath, self.profile)
+        options.extend(filter_options)
+        options.extend(["-b", "-i", training_file, "-o", self.weka_output(training_output), "-r", test_file,
+                        "-s", self.weka_output(test_output), "-c", class_column])
+        metrics = self.start_metrics("batch_filter", [training_file, test_file])
+        with metrics.phase("process"):
+            process_output, run_time = self.executor.run(options, metrics)
+        self.finish_output(training_output)
+        self.finish_output(test_output)
+        self.finish_metrics([training_output, test_output])
+        if self.verbose:
+            print("Filtering complete (time taken = {:.2f}s)".format(run_time))
+        return training_output, test_output
+
+    # Read the class value of each row of an ARFF file, as a code for each row and the codes of
+    # the class values. Only the class value is parsed from each row, and no rows are kept.
+    def read_classes(self, arff, class_column):
+        index = class_index(class_column, len(arff.attributes))
+        codes = {}
+        classes = array("i")
+        for line in arff.lines():
+            value = parse_value(line, index, len(arff.attributes), arff.defaults)
+            classes.append(codes.setdefault(value, len(codes)))
+        return classes, codes
+
+    # Return the row numbers, shuffled with a seeded generator if randomising.
+    def order_rows(self, count, randomise, seed):
+        if not randomise:
+            return range(count)
+        order = array("q", range(count))
+        random.Random(seed).shuffle(order)
+        return order
+
+    # Group the ordered row numbers by class, in the order of the class values.
+    def group_rows(self, order, classes, codes):
+        groups = [array("q") for code in codes]
+        for i in order:
+            groups[classes[i]].append(i)
+        return [groups[codes[value]] for value in sorted(codes)]
+
+    # Yield the data lines of an ARFF file in file order, in a single sequential scan.
+    def data_lines(self, arff):
+        for line in arff.lines():
+            yield line.rstrip("\r") + "\n"
+
+    # The number of rows out of count that go to the training file.
+    def training_rows(self, count, training_percentage):
+        return int(math.floor(count * training_percentage / 100.0 + 0.5))
+
+    # Split an ARFF file into training and testing files in a single pass, without starting a JVM.
+    # The first training_percentage% of the (optionally shuffled) rows go to the training file,
+    # as with Weka's RemovePercentage filter. With stratify=True the percentage is applied to each
+    # class separately, so both files keep the class proportions of the input.
+    # Each row is first assigned to a file (from its shuffled position and/or its class); the rows
+    # are then copied from the memory-mapped input (see ArffFile) in one sequential scan, so they
+    # keep their order from the input file.
+    def split(self, input_file_name=None, training_percentage=67, randomise=True, seed=None, stratify=False,
+              class_column="last"):
         if input_file_name is None:
             raise WekaPyException("An input file is needed for filtering")
         if not isinstance(training_percentage, int):
             raise WekaPyException("'training_percentage' argument must be of type (int).")
-        options = ["java", "-Xmx{}M".format(str(self.max_memory))]
-        if self.classpath is not None:
-            options.extend(["-cp", self.classpath])
         if randomise is True and seed is None:
             seed = random.randint(0, 1000)
-        if randomise is True:
-            if self.verbose:
-                print("Randomising data order...")
-            output_file = "{}-randomised.arff".format(str(input_file_name.rstrip(".arff")))
-            options.extend(
-                ["weka.filters.unsupervised.instance.Randomize", "-S", str(seed), "-i", input_file_name, "-o",
-                 output_file])
-            process_output, run_time = run_process(options)
-            input_file_name = output_file
-            if self.verbose:
-                print("Randomisation complete (time taken = {:.2f}s).".format(run_time))
+        start_time = time.time()
         if self.verbose:
-            print("Beginning split...\nCreating training set...")
-        output_file = "{}-training.arff".format(str(input_file_name.rstrip(".arff")))
-        options.extend(
-            ["weka.filters.unsupervised.instance.RemovePercentage", "-P", str(training_percentage), "-V", "-i",
-             input_file_name, "-o", output_file])
-        process_output, run_time_training = run_process(options)
+            print("Beginning split...")
+        metrics = self.start_metrics("split", [input_file_name])
+        with metrics.phase("read"):
+            arff = read_arff(input_file_name)
+        try:
+            with metrics.phase("read"):
+                count = arff.count()
+                training_count = self.training_rows(count, training_percentage)
+                training = None  # when neither randomising nor stratifying: the first training_count rows
+                if stratify:
+                    classes, codes = self.read_classes(arff, class_column)
+                    training = bytearray(count)
+                    for group in self.group_rows(self.order_rows(count, randomise, seed), classes, codes):
+                        for i in group[:self.training_rows(len(group), training_percentage)]:
+                            training[i] = 1
+                elif randomise:
+                    training = bytearray(count)
+                    for i in self.order_rows(count, randomise, seed)[:training_count]:
+                        training[i] = 1
+            metrics.add_rows(rows_in=count, rows_out=count)
+
+            base_name = arff_base(input_file_name) + ("-randomised" if randomise else "")
+            training_file = "{}-training{}".format(base_name, self.extension())
+            testing_file = "{}-testing{}".format(base_name, self.extension())
+            with metrics.phase("write"), open_arff(training_file, "w", self.compresslevel()) as training_arff, \
+                    open_arff(testing_file, "w", self.compresslevel()) as testing_arff:
+                training_arff.write("".join(arff.header))
+                testing_arff.write("".join(arff.header))
+                for i, line in enumerate(self.data_lines(arff)):
+                    in_training = training[i] if training is not None else i < training_count
+                    (training_arff if in_training else testing_arff).write(line)
+        finally:
+            arff.close()
+        self.finish_metrics([training_file, testing_file])
         if self.verbose:
-            print("Creating testing set...")
-        output_file = "{}-testing.arff".format(str(input_file_name.rstrip(".arff")))
-        options.extend(["weka.filters.unsupervised.instance.RemovePercentage", "-P", str(training_percentage), "-i",
-                        input_file_name, "-o", output_file])
-        process_output, run_time_testing = run_process(options)
+            print("Split complete (time taken = {:.2f}s).".format(time.time() - start_time))
+        return training_file, testing_file
+
+    # Write the training and testing files for each fold of a k-fold cross-validation, in a single
+    # pass, reading the input as split() does. Returns a list of (training file, testing file) pairs.
+    def kfold(self, input_file_name=None, folds=10, randomise=True, seed=None, stratify=False, class_column="last"):
+        if input_file_name is None:
+            raise WekaPyException("An input file is needed for filtering")
+        if not isinstance(folds, int) or folds < 2:
+            raise WekaPyException("'folds' argument must be an (int) of at least 2.")
+        if randomise is True and seed is None:
+            seed = random.randint(0, 1000)
+        start_time = time.time()
+        metrics = self.start_metrics("kfold", [input_file_name])
+        with metrics.phase("read"):
+            arff = read_arff(input_file_name)
+        try:
+            with metrics.phase("read"):
+                count = arff.count()
+                fold_of = None  # when neither randomising nor stratifying: consecutive runs of rows
+                if stratify:
+                    # deal each class's rows round-robin, so every fold gets the same class proportions
+                    classes, codes = self.read_classes(arff, class_column)
+                    fold_of = array("i", [0]) * count
+                    position = 0
+                    for group in self.group_rows(self.order_rows(count, randomise, seed), classes, codes):
+                        for i in group:
+                            fold_of[i] = position % folds
+                            position += 1
+                elif randomise:
+                    fold_of = array("i", [0]) * count
+                    for position, i in enumerate(self.order_rows(count, randomise, seed)):
+                        fold_of[i] = position * folds // count
+            metrics.add_rows(rows_in=count, rows_out=count * folds)
+
+            base_name = arff_base(input_file_name)
+            files = [("{}-fold{}-training{}".format(base_name, k, self.extension()),
+                      "{}-fold{}-testing{}".format(base_name, k, self.extension())) for k in range(folds)]
+            write_start = time.time()
+            outputs = [(open_arff(training_file, "w", self.compresslevel()),
+                        open_arff(testing_file, "w", self.compresslevel()))
+                       for training_file, testing_file in files]
+            try:
+                for training_arff, testing_arff in outputs:
+                    training_arff.write("".join(arff.header))
+                    testing_arff.write("".join(arff.header))
+                for i, line in enumerate(self.data_lines(arff)):
+                    fold = fold_of[i] if fold_of is not None else i * folds // count
+                    for k, (training_arff, testing_arff) in enumerate(outputs):
+                        (testing_arff if fold == k else training_arff).write(line)
+            finally:
+                for training_arff, testing_arff in outputs:
+                    training_arff.close()
+                    testing_arff.close()
+            metrics.add_phase("write", time.time() - write_start)
+        finally:
+            arff.close()
+        self.finish_metrics([file_name for pair in files for file_name in pair])
         if self.verbose:
-            print("Split complete (time taken = {:.2f}s).".format(run_time_training + run_time_testing))
+            print("Created {} folds (time taken = {:.2f}s).".format(folds, time.time() - start_time))
+        return files
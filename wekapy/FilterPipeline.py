@@ -0,0 +1,45 @@
+# FilterPipeline class
+#
+# Used to chain several weka.filters classes. The filters are combined with Weka's MultiFilter
+# and run in a single JVM, with the data passed from one stage to the next in memory rather
+# than through intermediate ARFF files.
+# Each stage is given as a list of filter options, as for Filter.filter().
+
+from wekapy.Filter import Filter
+from wekapy.Helpers import weka_spec
+from wekapy.WekaPyException import WekaPyException
+
+
+class FilterPipeline(Filter):
+    def __init__(self, filters=None, max_memory=1500, classpath=None, verbose=False, executor=None, compress=False,
+                 profile=None):
+        Filter.__init__(self, max_memory=max_memory, classpath=classpath, verbose=verbose, executor=executor,
+                        compress=compress, profile=profile)
+        self.filters = []
+        for filter_options in filters or []:
+            self.add(filter_options)
+
+    def add(self, filter_options):
+        if not filter_options or not isinstance(filter_options, (list, tuple)):
+            raise WekaPyException("Each filter must be given as a list of filter options.")
+        self.filters.append(list(filter_options))
+        return self
+
+    # The options for a MultiFilter running every stage in order.
+    def filter_options(self):
+        if len(self.filters) == 0:
+            raise WekaPyException("The pipeline has no filters.")
+        options = ["weka.filters.MultiFilter"]
+        for filter_options in self.filters:
+            options.extend(["-F", weka_spec(filter_options)])
+        return options
+
+    # Run every stage over an input file, writing only the final output.
+    def apply(self, input_file_name=None, output_file=None, class_column="last"):
+        return self.filter(self.filter_options(), input_file_name, output_file, class_column)
+
+    # Fit every stage on the training file and apply the same fitted pipeline to the test file.
+    def apply_batch(self, training_file=None, test_file=None, training_output=None, test_output=None,
+                    class_column="last"):
+        return self.batch_filter(self.filter_options(), training_file, test_file, training_output, test_output,
+                                 class_column)
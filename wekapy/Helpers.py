@@ -1,5 +1,13 @@
 from wekapy.WekaPyException import WekaPyException
+from wekapy.Metrics import rusage_usage
+from wekapy.LaunchProfile import get_profile
+import asyncio
+import gzip
+import io
+import os
+import shutil
 import subprocess
+import threading
 import time
 
 
@@ -7,13 +15,208 @@ def decode_data(data):
     return data.decode('utf-8').strip()
 
 
-def run_process(options):
-    start_time = time.time()
-    process = subprocess.Popen(options, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    process_output, process_error = map(decode_data, process.communicate())
+# Build the start of a java command line for the given heap size and classpath, with the flags
+# of a LaunchProfile (by default, the default profile).
+def java_command(max_memory, classpath=None, profile=None):
+    options = ["java", "-Xmx{}M".format(str(max_memory))]
+    options.extend(get_profile(profile).jvm_options(max_memory, classpath))
+    if classpath is not None:
+        options.extend(["-cp", classpath])
+    return options
+
+
+# Remove the .arff (or .arff.gz) extension from a file name.
+def arff_base(file_name):
+    file_name = str(file_name)
+    for extension in (".arff.gz", ".arff"):
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+
+# Open an ARFF file as text, through gzip if its name ends in .gz (as Weka does).
+def open_arff(file_name, mode="r", compresslevel=1):
+    if str(file_name).endswith(".gz"):
+        return gzip.open(file_name, mode + "t", compresslevel=compresslevel)
+    return open(file_name, mode, buffering=1 << 20)
+
+
+# Gzip a file, removing the uncompressed original.
+def compress_file(file_name, compressed_file_name, compresslevel=1):
+    with open(file_name, "rb") as source, gzip.open(compressed_file_name, "wb", compresslevel=compresslevel) as target:
+        shutil.copyfileobj(source, target, 1 << 20)
+    os.remove(file_name)
+
+
+# Quote a single option the way Weka's Utils.quote() does, so it survives Utils.splitOptions().
+def weka_quote(option):
+    if option and not any(char in option for char in " \t\n\r\"'\\"):
+        return option
+    for char, escaped in (("\\", "\\\\"), ("'", "\\'"), ("\"", "\\\""),
+                          ("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r")):
+        option = option.replace(char, escaped)
+    return "\"" + option + "\""
+
+
+# Join a Weka class name and its options into a single option string (e.g. for MultiFilter's -F).
+def weka_spec(options):
+    return " ".join(weka_quote(str(option)) for option in options)
+
+
+# Raise a WekaPyException for the first Exception/Error line in Weka's stderr output.
+def check_error(process_error):
     if any(word in process_error for word in ["Exception", "Error"]):
         for line in process_error.split("\n"):
             if any(word in line for word in ["Exception", "Error"]):
-                raise WekaPyException(line.split(' ', 1)[1])
+                raise WekaPyException(line.split(' ', 1)[1] if ' ' in line else line)
+
+
+# Wait for a process to exit, returning its (peak RSS in bytes, CPU seconds) where the platform
+# reports them, or (None, None).
+def wait_process(process):
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None, None
+    try:
+        pid, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:  # already reaped
+        process.wait()
+        return None, None
+    process.returncode = exit_code(status)
+    return rusage_usage(rusage)
+
+
+# Convert a wait status into a returncode as Popen reports it: the exit status, or the negated
+# number of the signal that killed the process.
+def exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return status
+
+
+def read_stderr(process):
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()))
+    reader.daemon = True
+    reader.start()
+    return reader, errors
+
+
+# Call write_input with a text stream writing to a binary stdin, then close it. Returns the
+# exception write_input raised, if any. The process exiting before reading all of its input is
+# not treated as an error here, since its stderr says why.
+def write_stdin(stdin, write_input):
+    text = io.TextIOWrapper(stdin, encoding="utf-8")
+    error = None
+    try:
+        write_input(text)
+    except (IOError, OSError):
+        pass
+    except Exception as exception:
+        error = exception
+    try:
+        text.close()
+    except (IOError, OSError):
+        pass
+    return error
+
+
+def start_writer(process, write_input):
+    errors = []
+    writer = threading.Thread(target=lambda: errors.append(write_stdin(process.stdin, write_input)))
+    writer.daemon = True
+    writer.start()
+    return writer, errors
+
+
+# Run a command, returning its stdout and the time taken. If a Metrics object is given, the
+# process's peak memory and CPU time are recorded in it. If write_input is given, it is called
+# with a text stream to write the process's stdin to, from a separate thread, while the process
+# runs.
+def run_process(options, metrics=None, write_input=None):
+    start_time = time.time()
+    process = subprocess.Popen(options, stdin=subprocess.PIPE if write_input is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader, errors = read_stderr(process)
+    if write_input is not None:
+        writer, input_errors = start_writer(process, write_input)
+    process_output = process.stdout.read()
+    process.stdout.close()
+    reader.join()
+    if write_input is not None:
+        writer.join()
+    usage = wait_process(process)
+    if metrics is not None:
+        metrics.add_process(*usage)
+    if write_input is not None and input_errors[0] is not None:
+        raise input_errors[0]
+    check_error(decode_data(errors[0]) if errors else "")
     end_time = time.time()
-    return process_output, end_time - start_time
+    return decode_data(process_output), end_time - start_time
+
+
+# Run a command and yield its stdout line by line while it runs. stderr is collected in
+# the background and checked for Weka errors once the process has finished.
+def stream_process(options, metrics=None, write_input=None):
+    process = subprocess.Popen(options, stdin=subprocess.PIPE if write_input is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader, errors = read_stderr(process)
+    if write_input is not None:
+        writer, input_errors = start_writer(process, write_input)
+    try:
+        for line in process.stdout:
+            yield line.decode('utf-8')
+        usage = wait_process(process)
+        if metrics is not None:
+            metrics.add_process(*usage)
+    finally:
+        if process.poll() is None:  # the consumer stopped early
+            process.kill()
+            process.wait()
+        process.stdout.close()
+    reader.join()
+    if write_input is not None:
+        writer.join()
+        if input_errors[0] is not None:
+            raise input_errors[0]
+    check_error(decode_data(errors[0]) if errors else "")
+
+
+# Run a command as an asyncio subprocess. If the calling task is cancelled, the process is killed.
+# Peak memory and CPU time are not available for asyncio subprocesses, which the event loop reaps.
+# write_input, if given, is run in a thread as in run_process().
+async def run_process_async(options, metrics=None, write_input=None):
+    start_time = time.time()
+    loop = asyncio.get_event_loop()
+    stdin = None
+    if write_input is not None:
+        stdin, input_pipe = os.pipe()
+    try:
+        process = await asyncio.create_subprocess_exec(*options, stdin=stdin, stdout=subprocess.PIPE,
+                                                       stderr=subprocess.PIPE)
+    except BaseException:
+        if write_input is not None:
+            os.close(input_pipe)
+        raise
+    finally:
+        if write_input is not None:
+            os.close(stdin)
+    writer = None
+    if write_input is not None:
+        writer = loop.run_in_executor(None, write_stdin, io.open(input_pipe, "wb"), write_input)
+    try:
+        process_output, process_error = await process.communicate()
+        input_error = await writer if writer is not None else None
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if metrics is not None:
+        metrics.add_process()
+    if input_error is not None:
+        raise input_error
+    check_error(decode_data(process_error))
+    return decode_data(process_output), time.time() - start_time
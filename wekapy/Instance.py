@@ -8,6 +8,8 @@ from wekapy.Feature import Feature
 
 
 class Instance:
+    __slots__ = ("features",)
+
     def __init__(self, features=None):
         self.features = features
         if features is None:
@@ -0,0 +1,109 @@
+# LaunchProfile class
+#
+# Used internally by Model and Filter to add JVM flags to each java command line they build, and
+# externally to choose those flags. A LaunchProfile sets the initial heap size, the garbage
+# collector and how far the JIT compiler goes. It also uses the class data sharing (AppCDS)
+# archive built for the classpath by warmup() (or `python -m wekapy warmup`), if there is one, so
+# each JVM maps weka.jar's classes from the archive instead of loading and verifying them again.
+# Pass a LaunchProfile (or the name of one in PROFILES) as a Model's or Filter's profile argument,
+# or change the default for all of them with set_default_profile().
+#   - "default": only the class data sharing archive, if one has been built
+#   - "short": for short jobs (filtering, scoring small test sets), where startup dominates: the
+#     serial collector, the C1 JIT compiler only and no hsperfdata file
+#   - "throughput": for long training runs: the parallel collector, with the whole heap committed
+#     up front
+
+from wekapy.WekaPyException import WekaPyException
+import hashlib
+import os
+
+ARCHIVE_DIR = "wekapy_data/cds"
+
+GARBAGE_COLLECTORS = {
+    "serial": "-XX:+UseSerialGC",
+    "parallel": "-XX:+UseParallelGC",
+    "g1": "-XX:+UseG1GC",
+    "z": "-XX:+UseZGC",
+    "shenandoah": "-XX:+UseShenandoahGC",
+}
+
+
+# The classpath a JVM started with this classpath argument uses.
+def effective_classpath(classpath):
+    return classpath if classpath is not None else os.environ.get("CLASSPATH", ".")
+
+
+# The path of the class data sharing archive for a classpath.
+def archive_file(classpath, archive_dir=ARCHIVE_DIR):
+    digest = hashlib.sha1(effective_classpath(classpath).encode("utf-8")).hexdigest()[:12]
+    return os.path.abspath(os.path.join(archive_dir, digest + ".jsa"))
+
+
+class LaunchProfile:
+    # initial_memory is the initial heap size in MB, or "max" for max_memory. gc is one of
+    # GARBAGE_COLLECTORS. With tiered_stop_at_level=1 only the C1 compiler is used. options are
+    # added to the command line as they are.
+    def __init__(self, initial_memory=None, gc=None, tiered_stop_at_level=None, class_data_sharing=True,
+                 archive_dir=ARCHIVE_DIR, options=None):
+        if initial_memory is not None and initial_memory != "max" and not isinstance(initial_memory, int):
+            raise WekaPyException("'initial_memory' argument must be an (int) or \"max\".")
+        if gc is not None and gc not in GARBAGE_COLLECTORS:
+            raise WekaPyException("'gc' argument must be one of: {}.".format(", ".join(sorted(GARBAGE_COLLECTORS))))
+        if tiered_stop_at_level is not None and tiered_stop_at_level not in range(0, 5):
+            raise WekaPyException("'tiered_stop_at_level' argument must be from 0 to 4.")
+        self.initial_memory = initial_memory
+        self.gc = gc
+        self.tiered_stop_at_level = tiered_stop_at_level
+        self.class_data_sharing = class_data_sharing
+        self.archive_dir = archive_dir
+        self.options = list(options) if options is not None else []
+
+    # The JVM flags for a java command line with this heap size and classpath.
+    def jvm_options(self, max_memory, classpath=None):
+        options = []
+        if self.initial_memory == "max":
+            options.append("-Xms{}M".format(max_memory))
+        elif self.initial_memory is not None:
+            options.append("-Xms{}M".format(min(self.initial_memory, max_memory)))
+        if self.gc is not None:
+            options.append(GARBAGE_COLLECTORS[self.gc])
+        if self.tiered_stop_at_level is not None:
+            options.append("-XX:TieredStopAtLevel={}".format(self.tiered_stop_at_level))
+        if self.class_data_sharing:
+            archive = archive_file(classpath, self.archive_dir)
+            if os.path.exists(archive):
+                # with -Xshare:auto a JVM that cannot use the archive (e.g. after a Java upgrade) ignores it
+                options.extend(["-XX:SharedArchiveFile=" + archive, "-Xshare:auto"])
+        options.extend(self.options)
+        return options
+
+    def __repr__(self):
+        return "LaunchProfile(initial_memory={!r}, gc={!r}, tiered_stop_at_level={!r}, class_data_sharing={!r})".format(
+            self.initial_memory, self.gc, self.tiered_stop_at_level, self.class_data_sharing)
+
+
+PROFILES = {
+    "default": LaunchProfile(),
+    "short": LaunchProfile(gc="serial", tiered_stop_at_level=1, options=["-XX:-UsePerfData"]),
+    "throughput": LaunchProfile(initial_memory="max", gc="parallel"),
+}
+
+default_profile = PROFILES["default"]
+
+
+# Resolve a profile argument: a LaunchProfile, the name of one in PROFILES, or None for the default.
+def get_profile(profile=None):
+    if profile is None:
+        return default_profile
+    if isinstance(profile, LaunchProfile):
+        return profile
+    if profile in PROFILES:
+        return PROFILES[profile]
+    raise WekaPyException("Unknown launch profile '{}'; use a LaunchProfile or one of: {}.".format(
+        profile, ", ".join(sorted(PROFILES))))
+
+
+# Change the profile used by every Model and Filter not given one of its own.
+def set_default_profile(profile):
+    global default_profile
+    default_profile = get_profile(profile) if profile is not None else PROFILES["default"]
@@ -0,0 +1,69 @@
+# MemoryLimiter class
+#
+# Used with the asyncio API (Model.atrain(), Model.atest(), Filter.afilter()) to limit how many
+# JVMs run at once. Each JVM reserves its max_memory (in MB) from the limiter's total for as
+# long as it runs, and further requests wait until enough memory is released.
+# By default the total is the host's physical memory.
+
+from wekapy.WekaPyException import WekaPyException
+import asyncio
+import os
+
+
+def physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class MemoryLimiter:
+    def __init__(self, max_memory=None, max_processes=None):
+        if max_memory is None:
+            max_memory = physical_memory()
+        if max_memory is None:
+            raise WekaPyException("Could not find the host's memory size; please set 'max_memory'.")
+        self.max_memory = max_memory
+        self.max_processes = max_processes
+        self.used_memory = 0
+        self.processes = 0
+        self.condition = None
+
+    def has_room(self, memory):
+        if self.max_processes is not None and self.processes >= self.max_processes:
+            return False
+        return self.used_memory + memory <= self.max_memory
+
+    async def acquire(self, memory):
+        if memory > self.max_memory:
+            raise WekaPyException("A JVM needing {}MB can never fit in the limiter's {}MB.".format(
+                memory, self.max_memory))
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.has_room(memory))
+            self.used_memory += memory
+            self.processes += 1
+
+    async def release(self, memory):
+        async with self.condition:
+            self.used_memory -= memory
+            self.processes -= 1
+            self.condition.notify_all()
+
+    # Reserve memory for the body of an "async with" block.
+    def reserve(self, memory):
+        return MemoryReservation(self, memory)
+
+
+class MemoryReservation:
+    def __init__(self, limiter, memory):
+        self.limiter = limiter
+        self.memory = memory
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.memory)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.limiter.release(self.memory)
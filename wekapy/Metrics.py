@@ -0,0 +1,167 @@
+# Metrics class
+#
+# Used internally by Model and Filter to record how each operation (train, test, filter, ...)
+# spent its time and resources, and externally to read them back (e.g. model.metrics) or export
+# them. A Metrics object holds the duration of each phase of the operation (writing ARFF files,
+# running the JVM, parsing its output, ...), the peak resident memory and CPU time of the JVMs
+# it ran, and the bytes and rows read and written.
+# Hooks are callables taking a finished Metrics object. Hooks added with add_hook() are called
+# for every operation; hooks added with Model.add_hook()/Filter.add_hook() only for that object's.
+
+import os
+import re
+import sys
+import threading
+import time
+
+HOOKS = []
+
+# Weka's own timings, printed when training and evaluating a classifier
+WEKA_TIMES = (
+    ("weka_build", re.compile(r"Time taken to build model:\s*([\d.]+) seconds")),
+    ("weka_test", re.compile(r"Time taken to test model on [\w ]+:\s*([\d.]+) seconds")),
+    ("weka_cross_validation", re.compile(r"Time taken to perform cross-validation:\s*([\d.]+) seconds")),
+)
+
+
+# Call a function with every finished Metrics object, e.g. to export it to a metrics system.
+def add_hook(hook):
+    HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+
+# The peak resident memory (in bytes) and CPU time (in seconds) of a running process, read from
+# /proc where available. Returns (None, None) elsewhere.
+def process_usage(pid):
+    try:
+        with open("/proc/{}/status".format(pid)) as status:
+            peak_rss = None
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    peak_rss = int(line.split()[1]) * 1024
+        with open("/proc/{}/stat".format(pid)) as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        # utime and stime, fields 14 and 15 of the whole line
+        cpu_time = (int(fields[11]) + int(fields[12])) / float(clock_ticks())
+        return peak_rss, cpu_time
+    except (IOError, OSError, IndexError, ValueError):
+        return None, None
+
+
+def clock_ticks():
+    try:
+        return os.sysconf("SC_CLK_TCK")
+    except (ValueError, OSError, AttributeError):
+        return 100
+
+
+# Convert the resource usage from os.wait4() into (peak RSS in bytes, CPU seconds).
+def rusage_usage(rusage):
+    # ru_maxrss is in kilobytes on Linux, but bytes on macOS
+    peak_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return peak_rss, rusage.ru_utime + rusage.ru_stime
+
+
+class Metrics:
+    def __init__(self, operation, hooks=None):
+        self.operation = operation
+        self.phases = {}
+        self.processes = 0
+        self.peak_rss = None
+        self.cpu_time = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.rows_in = None
+        self.rows_out = None
+        self.start_time = time.time()
+        self.total_time = None
+        self.hooks = hooks if hooks is not None else []
+        self.lock = threading.Lock()
+
+    # Time a phase of the operation: `with metrics.phase("arff"): ...`. Time spent in a phase
+    # more than once is added up.
+    def phase(self, name):
+        return PhaseTimer(self, name)
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    # Record a JVM run by this operation, with its peak RSS (bytes) and CPU time (seconds) if known.
+    def add_process(self, peak_rss=None, cpu_time=None):
+        with self.lock:
+            self.processes += 1
+            if peak_rss is not None:
+                self.peak_rss = peak_rss if self.peak_rss is None else max(self.peak_rss, peak_rss)
+            if cpu_time is not None:
+                self.cpu_time = cpu_time if self.cpu_time is None else self.cpu_time + cpu_time
+
+    def add_rows(self, rows_in=None, rows_out=None):
+        with self.lock:
+            if rows_in is not None:
+                self.rows_in = (self.rows_in or 0) + rows_in
+            if rows_out is not None:
+                self.rows_out = (self.rows_out or 0) + rows_out
+
+    def add_bytes(self, bytes_in=0, bytes_out=0):
+        with self.lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    # Record the timings Weka printed, and how much of the JVM's run time they leave unaccounted
+    # for (JVM startup, class loading, reading the data and (de)serializing the model).
+    def add_weka_times(self, process_output):
+        weka_time = 0.0
+        for name, pattern in WEKA_TIMES:
+            for match in pattern.finditer(process_output):
+                self.add_phase(name, float(match.group(1)))
+                weka_time += float(match.group(1))
+        if weka_time > 0 and "process" in self.phases:
+            self.add_phase("jvm_overhead", max(0.0, self.phases["process"] - weka_time))
+
+    # Mark the operation as finished and pass it to the hooks.
+    def finish(self):
+        self.total_time = time.time() - self.start_time
+        for hook in HOOKS + self.hooks:
+            hook(self)
+        return self
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "total_time": self.total_time,
+            "phases": dict(self.phases),
+            "processes": self.processes,
+            "peak_rss": self.peak_rss,
+            "cpu_time": self.cpu_time,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+        }
+
+    def __str__(self):
+        phases = ", ".join("{} {:.3f}s".format(name, seconds) for name, seconds in self.phases.items())
+        return "{}: {:.3f}s ({})\tpeak RSS: {}\tCPU: {}\tin: {} bytes, {} rows\tout: {} bytes, {} rows".format(
+            self.operation, self.total_time or 0.0, phases,
+            "?" if self.peak_rss is None else "{:.0f}MB".format(self.peak_rss / 1048576.0),
+            "?" if self.cpu_time is None else "{:.2f}s".format(self.cpu_time),
+            self.bytes_in, "?" if self.rows_in is None else self.rows_in,
+            self.bytes_out, "?" if self.rows_out is None else self.rows_out)
+
+
+class PhaseTimer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_phase(self.name, time.time() - self.start_time)
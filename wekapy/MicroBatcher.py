@@ -0,0 +1,150 @@
+# MicroBatcher class
+#
+# Used internally by Model.predict_one() and Model.predict_many() for low-latency scoring.
+# Instances submitted by concurrent callers are queued and merged into micro-batches of up to
+# max_batch_size instances, waiting at most max_wait seconds for a batch to fill. Each batch
+# is sent inline to a resident Weka worker, which keeps the model deserialized in memory, so no
+# ARFF file is written and no JVM is started per request.
+# Per-request latencies are recorded so throughput can be tuned against latency.
+
+from wekapy.ArffWriter import ArffWriter
+from wekapy.Executor import WorkerExecutor
+from wekapy.Helpers import java_command
+from wekapy.Prediction import parse_prediction
+from wekapy.WekaPyException import WekaPyException
+from concurrent.futures import Future
+from collections import deque
+import io
+import queue
+import threading
+import time
+
+
+class LatencyStats:
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def record_batch(self, size, latencies):
+        with self.lock:
+            self.batches += 1
+            self.requests += size
+            self.batch_sizes.append(size)
+            self.latencies.extend(latencies)
+
+    def percentile(self, values, fraction):
+        if len(values) == 0:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    # Latencies are in seconds, over the most recent `window` requests.
+    def summary(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            batch_sizes = list(self.batch_sizes)
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "p50": self.percentile(latencies, 0.5),
+                "p99": self.percentile(latencies, 0.99),
+                "mean_batch_size": float(sum(batch_sizes)) / len(batch_sizes) if batch_sizes else 0.0,
+            }
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=64, max_wait=0.005):
+        if not isinstance(max_batch_size, int) or max_batch_size < 1:
+            raise WekaPyException("'max_batch_size' argument must be a positive (int).")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = LatencyStats()
+        self.attributes = None
+        if isinstance(model.executor, WorkerExecutor):
+            self.executor = model.executor
+            self.owns_executor = False
+        else:
+            self.executor = WorkerExecutor()
+            self.owns_executor = True
+        self.requests = queue.Queue()
+        self.running = True
+        self.thread = threading.Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    # Queue an instance for prediction, returning a Future for its Prediction.
+    def submit(self, instance):
+        if not self.running:
+            raise WekaPyException("The batcher has been stopped.")
+        attributes = [(feature.name, str(feature.possible_values)) for feature in instance.features]
+        if self.attributes is None:
+            self.attributes = attributes
+        elif attributes != self.attributes:
+            raise WekaPyException("All instances passed to predict_one() must have the same features.")
+        future = Future()
+        self.requests.put((instance, future, time.time()))
+        return future
+
+    # Wait for the first request, then gather more until the batch is full or max_wait has passed.
+    def next_batch(self):
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)  # stop after this batch
+                break
+            batch.append(request)
+        return batch
+
+    def loop(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            try:
+                predictions = self.predict([instance for instance, future, submitted in batch])
+            except Exception as e:
+                for instance, future, submitted in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.time()
+            for (instance, future, submitted), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+            self.stats.record_batch(len(batch), [finished - submitted for instance, future, submitted in batch])
+
+    def predict(self, instances):
+        output = io.StringIO()
+        with ArffWriter(None, "wekapy-batch", output=output, sparse=self.model.sparse) as writer:
+            writer.write_instances(instances)
+        options = java_command(self.model.max_memory, self.model.classpath, self.model.profile)
+        options.extend(["wekapy.predict", self.model.model_file])
+        options.extend(line for line in output.getvalue().split("\n") if line)
+        process_output, time_taken = self.executor.run(options)
+        predictions = [None] * len(instances)
+        for line in process_output.split("\n"):
+            prediction = parse_prediction(line)
+            if prediction is not None:
+                predictions[prediction.index - 1] = prediction
+        if None in predictions:
+            raise WekaPyException("Weka did not return a prediction for every instance in the batch.")
+        return predictions
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.requests.put(None)
+            self.thread.join()
+            if self.owns_executor:
+                self.executor.close()
@@ -4,32 +4,99 @@
 # The Model class should be instantiated as the first stage, from which it can be trained
 # and/or tested.
 # Instantiate with a classifier_type (and any optional arguments)
+# Generated ARFF and model files are written under arff_dir and model_dir (by default in
+# wekapy_data/), which can point at fast scratch storage. With compress=True (or a gzip level
+# from 1 to 9) generated ARFF files are gzip-compressed, which Weka reads natively. With
+# cleanup=True generated test ARFF files are deleted once each test run has finished. The
+# training ARFF file is kept as the log that update() appends to, and close() (or leaving a
+# `with` block) deletes it with every other file the Model generated.
+# With transport="pipe", instances passed to train(), test() and update() are streamed to Weka
+# as ARFF through the JVM's stdin (or a WorkerExecutor's request stream) while they are being
+# generated, instead of being written to a file first. The default transport="file" keeps the
+# generated ARFF files, which can help with debugging.
+# Each JVM is started with the flags of the LaunchProfile given as profile (by default, the
+# default profile), which also uses a class data sharing archive built by warmup().
+# After each train(), test() or update() call, self.metrics holds a Metrics object with the
+# durations of its phases, the JVMs' peak memory and CPU time, and byte and row counts.
 
-from wekapy.Prediction import Prediction
+from wekapy.Prediction import parse_prediction
+from wekapy.PredictionMatrix import PredictionMatrix
+from wekapy.Evaluation import parse_evaluation
 from wekapy.Instance import Instance
-from wekapy.Helpers import run_process
+from wekapy.Dataset import Dataset, parse_possible_values, NOMINAL
+from wekapy.ArffWriter import ArffWriter, ArffStream
+from wekapy.ArffReader import read_header, header_schema, is_data_line, count_rows
+from wekapy.Helpers import java_command, open_arff
+from wekapy.Executor import ProcessExecutor
+from wekapy.MicroBatcher import MicroBatcher, LatencyStats
+from wekapy.Metrics import Metrics
+from wekapy.LaunchProfile import get_profile
 from wekapy.WekaPyException import WekaPyException
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import shutil
+import threading
+import time
 import uuid
 
+MIN_JVM_MEMORY = 256
+
+# Classifiers implementing Weka's UpdateableClassifier, whose models update() changes in place
+UPDATEABLE_CLASSIFIERS = (
+    "bayes.NaiveBayesUpdateable",
+    "bayes.NaiveBayesMultinomialUpdateable",
+    "bayes.NaiveBayesMultinomialText",
+    "functions.SGD",
+    "functions.SGDText",
+    "lazy.IBk",
+    "lazy.KStar",
+    "lazy.LWL",
+    "meta.MultiClassClassifierUpdateable",
+    "trees.HoeffdingTree",
+)
+
 
 class Model:
-    def __init__(self, classifier_type=None, max_memory=1500, classpath=None, verbose=False):
+    def __init__(self, classifier_type=None, max_memory=1500, classpath=None, verbose=False, executor=None,
+                 options=None, cache=None, sparse=None, arff_dir=None, model_dir=None, compress=False,
+                 cleanup=False, transport="file", profile=None):
         if classifier_type is None or not isinstance(classifier_type, str):
             raise WekaPyException("A classifier type is required for construction.")
         if not isinstance(max_memory, int):
             raise WekaPyException("'max_memory' argument must be of type (int).")
+        if not isinstance(compress, bool) and compress not in range(1, 10):
+            raise WekaPyException("'compress' argument must be a (bool) or a gzip level from 1 to 9.")
+        if transport not in ("file", "pipe"):
+            raise WekaPyException("'transport' argument must be \"file\" or \"pipe\".")
+        get_profile(profile)  # raises for an unknown profile
         self.id = uuid.uuid4()
-        self.model_dir = "wekapy_data/models"
-        self.arff_dir = "wekapy_data/arff"
+        self.model_dir = model_dir if model_dir is not None else "wekapy_data/models"
+        self.arff_dir = arff_dir if arff_dir is not None else "wekapy_data/arff"
+        self.compress = compress
+        self.cleanup = cleanup
+        self.transport = transport
+        self.profile = profile
+        self.generated_files = []
         self.classpath = classpath
         self.classifier = classifier_type
+        self.options = list(options) if options is not None else []
         self.max_memory = max_memory
         self.training_instances = []
         self.testing_instances = []
         self.predictions = []
         self.time_taken = 0.0
+        self.evaluation = None
+        self.shard_times = []
+        self.metrics = None
+        self.hooks = []
         self.verbose = verbose
+        self.executor = executor if executor is not None else ProcessExecutor()
+        self.cache = cache
+        self.sparse = sparse
+        self.batcher = None
+        self.batcher_lock = threading.Lock()
+        self.training_lock = threading.Lock()
         self.trained = False
         self.model_file = None
         self.training_file = None
@@ -39,27 +106,79 @@ class Model:
         if not os.path.exists(self.arff_dir):
             os.makedirs(self.arff_dir)
 
-    # Generate an ARFF file from a list of instances
-    def create_arff(self, instances, data_type):
-        output_arff = open(os.path.join(self.arff_dir, "{}-{}.arff".format(str(self.id), data_type)), "w")
-        output_arff.write("@relation " + str(self.id) + "\n")
-        for i, instance in enumerate(instances):
-            if i == 0:
-                for feature in instance.features:
-                    output_arff.write("\t@attribute " + feature.name + " " + str(feature.possible_values) + "\n")
-                output_arff.write("\n@data\n")
-            str_to_write = ""
-            for j, feature in enumerate(instance.features):
-                if j == 0:
-                    str_to_write = str_to_write + str(feature.value)
-                else:
-                    str_to_write = str_to_write + "," + str(feature.value)
-            output_arff.write(str_to_write + "\n")
-        output_arff.close()
-        if data_type == "training":
-            self.training_file = self.arff_dir + "/" + str(self.id) + "-" + data_type + ".arff"
-        if data_type == "test":
-            self.test_file = self.arff_dir + "/" + str(self.id) + "-" + data_type + ".arff"
+    # Generate an ARFF file from a Dataset or an iterable (list, generator, ...) of instances,
+    # returning its name. Unless another arff_file is given, it becomes this Model's training or
+    # test file. Its time and rows are recorded in metrics (by default self.metrics).
+    def create_arff(self, instances, data_type, arff_file=None, metrics=None):
+        own_file = arff_file is None
+        if own_file:
+            arff_file = self.arff_dir + "/" + str(self.id) + "-" + data_type + self.arff_extension()
+        metrics = metrics if metrics is not None else self.metrics
+        self.generated_files.append(arff_file)
+        start_time = time.time()
+        with ArffWriter(arff_file, str(self.id), sparse=self.sparse, compresslevel=self.compresslevel()) as writer:
+            self.write_arff(writer, instances)
+        if metrics is not None:
+            metrics.add_phase("arff", time.time() - start_time)
+            metrics.add_rows(rows_in=writer.rows)
+        if own_file and data_type == "training":
+            self.training_file = arff_file
+        if own_file and data_type == "test":
+            self.test_file = arff_file
+        return arff_file
+
+    # Prepare instances for Weka, returning (ARFF file, None), or with pipe=True (None, ArffStream),
+    # for the instances to be written to Weka while it runs.
+    def prepare_data(self, instances, data_type, pipe, arff_file=None, metrics=None):
+        if not pipe:
+            return self.create_arff(instances, data_type, arff_file, metrics), None
+        if arff_file is None and data_type == "training":
+            self.training_file = None
+        if arff_file is None and data_type == "test":
+            self.test_file = None
+        return None, ArffStream(instances, str(self.id), self.sparse,
+                                metrics=metrics if metrics is not None else self.metrics)
+
+    def write_arff(self, writer, instances):
+        if isinstance(instances, Dataset):
+            writer.write_dataset(instances)
+        else:
+            writer.write_instances(instances)
+
+    def arff_extension(self):
+        return ".arff.gz" if self.compress else ".arff"
+
+    def compresslevel(self):
+        return 1 if isinstance(self.compress, bool) else self.compress
+
+    # Call a function with the Metrics of each of this Model's operations once it has finished.
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def start_metrics(self, operation):
+        self.metrics = Metrics(operation, self.hooks)
+        return self.metrics
+
+    def add_file_size(self, file_name, direction, metrics=None):
+        metrics = metrics if metrics is not None else self.metrics
+        if file_name is not None and os.path.exists(file_name):
+            if direction == "in":
+                metrics.add_bytes(bytes_in=os.path.getsize(file_name))
+            else:
+                metrics.add_bytes(bytes_out=os.path.getsize(file_name))
+
+    # Delete the generated files in a list, e.g. after a run when cleanup=True.
+    def remove_generated(self, files):
+        for generated_file in files:
+            if generated_file in self.generated_files:
+                self.generated_files.remove(generated_file)
+            if os.path.exists(generated_file):
+                os.remove(generated_file)
+
+    # Delete the generated test ARFF file of a finished run, if cleanup=True.
+    def cleanup_test(self):
+        if self.cleanup and self.test_file in self.generated_files:
+            self.remove_generated([self.test_file])
 
     # Load a model, if it exists, and set this as the currently trained model for this
     # Model instance.
@@ -84,45 +203,238 @@ class Model:
         else:
             raise WekaPyException("Argument 'instance' must be of type Instance.")
 
-    # Train the model with the chosen classifier from features in an ARFF file
-    def train(self, training_file=None, instances=None, save_as=None, folds=10):
-        if self.verbose:
-            print("Training your classifier...")
+    # Build the Weka command for training the model from features in an ARFF file, generating the
+    # ARFF file if needed. Returns the command, the cache key and, with transport="pipe", the
+    # ArffStream writing the instances, or (None, None, None) if the model was found in the cache.
+    def train_command(self, training_file=None, instances=None, save_as=None, folds=10):
+        keep_model = save_as is not None
         if save_as is None:
             save_as = self.model_dir + "/" + str(self.id) + ".model"
+            if save_as not in self.generated_files:
+                self.generated_files.append(save_as)
+        pipe = self.transport == "pipe"
+        write_input = None
         if len(self.training_instances) == 0:  # if add_train_instance not called:
             if training_file is None and instances is None:
                 raise WekaPyException(
                     "Please provide some train instances either by naming an ARFF train_set, providing a list of Instances, or calling add_train_instance().")
             if training_file is None:
-                self.create_arff(instances, "training")
+                write_input = self.prepare_data(instances, "training", pipe)[1]
             if instances is None:
                 self.training_file = training_file
         if len(self.training_instances) > 0:  # if add_train_instance called:
             if training_file is None and instances is None:
-                self.create_arff(self.training_instances, "training")
+                write_input = self.prepare_data(self.training_instances, "training", pipe)[1]
             # Prioritise adding features passed at call time
             if training_file is None and instances is not None:
-                self.create_arff(instances, "training")
+                write_input = self.prepare_data(instances, "training", pipe)[1]
             # Prioritise ARFF file passed at calltime
             if instances is None and training_file is not None:
                 self.training_file = training_file
 
+        self.add_file_size(self.training_file, "in")
+        cache_key = None
+        if self.cache is not None and write_input is None:  # piped data cannot be hashed before it is sent
+            start_time = time.time()
+            cache_key = self.cache.key(self.training_file, self.classifier, self.options, folds, self.classpath)
+            cached = self.cache.lookup(cache_key)
+            self.metrics.add_phase("cache", time.time() - start_time)
+            if cached is not None:
+                self.model_file, process_output = cached
+                if keep_model:  # the caller asked for the model at a particular path
+                    shutil.copyfile(self.model_file, save_as)
+                    self.model_file = save_as
+                self.evaluation = parse_evaluation(process_output)
+                self.trained = True
+                self.time_taken = time.time() - start_time
+                self.metrics.finish()
+                if self.verbose:
+                    print("Using cached model (time taken = {:.2f}s).".format(self.time_taken))
+                return None, None, None
+
         self.model_file = save_as
-        options = ["java", "-Xmx{}M".format(str(self.max_memory))]
-        if self.classpath is not None:
-            options.extend(["-cp", self.classpath])
-        options.extend(
-            ["weka.classifiers." + self.classifier, "-x", str(folds), "-t", self.training_file, "-d", save_as])
-        process_output, self.time_taken = run_process(options)
+        options = java_command(self.max_memory, self.classpath, self.profile)
+        if write_input is not None:
+            options.append("wekapy.train")
+        options.extend(["weka.classifiers." + self.classifier, "-x", str(folds),
+                        "-t", "-" if write_input is not None else self.training_file, "-d", save_as])
+        options.extend(self.options)  # last, so options after a "--" reach a meta classifier's base classifier
+        return options, cache_key, write_input
+
+    # Record the results of a training run
+    def finish_train(self, process_output, cache_key):
+        with self.metrics.phase("parse"):
+            self.evaluation = parse_evaluation(process_output)
         self.trained = True
+        self.metrics.add_weka_times(process_output)
+        self.metrics.add_bytes(bytes_out=len(process_output))
+        self.add_file_size(self.model_file, "out")
+        if cache_key is not None:
+            with self.metrics.phase("cache"):
+                self.cache.store(cache_key, self.model_file, process_output)
+        self.metrics.finish()
         if self.verbose:
             print("Training complete (time taken = {:.2f}s).".format(self.time_taken))
 
-    # Generate predictions from the trained model from test features in an ARFF file
-    def test(self, test_file=None, instances=None, model_file=None):
+    # Claim this Model for a training run, which replaces its model file, training file and
+    # metrics. Only one train(), atrain() or update() can be in progress on a Model at a time;
+    # train several models at once with a Model (or an Experiment) each.
+    def start_training(self):
+        if not self.training_lock.acquire(False):
+            raise WekaPyException("This Model is already being trained or updated. "
+                                  "Use a separate Model for each concurrent training run.")
+
+    # Train the model with the chosen classifier from features in an ARFF file
+    def train(self, training_file=None, instances=None, save_as=None, folds=10):
+        self.start_training()
+        try:
+            self.run_train(training_file, instances, save_as, folds)
+        finally:
+            self.training_lock.release()
+
+    def run_train(self, training_file=None, instances=None, save_as=None, folds=10):
         if self.verbose:
-            print("Generating predictions for your test set...")
+            print("Training your classifier...")
+        self.start_metrics("train")
+        options, cache_key, write_input = self.train_command(training_file, instances, save_as, folds)
+        if options is None:
+            return
+        with self.metrics.phase("process"):
+            process_output, self.time_taken = self.executor.run(options, self.metrics, write_input)
+        self.finish_train(process_output, cache_key)
+
+    # Train the model as train() does, from a coroutine. Generating the ARFF file runs in a thread
+    # and the JVM is run as an asyncio subprocess, which is killed if the coroutine is cancelled.
+    # If a MemoryLimiter is given, this waits until it has room for another max_memory JVM.
+    # Like train(), it raises if the Model is already being trained.
+    async def atrain(self, training_file=None, instances=None, save_as=None, folds=10, limiter=None):
+        self.start_training()
+        try:
+            if self.verbose:
+                print("Training your classifier...")
+            loop = asyncio.get_event_loop()
+            self.start_metrics("train")
+            options, cache_key, write_input = await loop.run_in_executor(
+                None, lambda: self.train_command(training_file, instances, save_as, folds))
+            if options is None:
+                return
+            with self.metrics.phase("process"):
+                process_output, self.time_taken = await self.arun(options, limiter, write_input)
+            await loop.run_in_executor(None, self.finish_train, process_output, cache_key)
+        finally:
+            self.training_lock.release()
+
+    async def arun(self, options, limiter=None, write_input=None, metrics=None):
+        metrics = metrics if metrics is not None else self.metrics
+        if limiter is None:
+            return await self.executor.arun(options, metrics, write_input)
+        async with limiter.reserve(self.max_memory):
+            return await self.executor.arun(options, metrics, write_input)
+
+    # Add new training instances (a Dataset or an iterable of Instances) to the trained model.
+    # The rows are appended to the training ARFF file, which is kept as a log of all the training
+    # data, without rewriting its header or existing rows (a file passed to train() is copied
+    # first, see training_log()). Models of an updateable classifier (see UPDATEABLE_CLASSIFIERS)
+    # are then updated in place with just the new rows, so the cost is proportional to the new
+    # data; other models are retrained from the whole log.
+    def update(self, instances=None, folds=10):
+        if not self.trained:
+            raise WekaPyException("The classifier has not yet been trained. Please call train() first")
+        if instances is None:
+            raise WekaPyException("Please provide some instances to update the model with.")
+        self.start_training()
+        try:
+            self.run_update(instances, folds)
+        finally:
+            self.training_lock.release()
+
+    def run_update(self, instances, folds):
+        self.start_metrics("update")
+        with self.metrics.phase("arff"):
+            log_file = self.training_log()
+        if self.classifier not in UPDATEABLE_CLASSIFIERS:
+            if log_file is None:
+                raise WekaPyException("The training ARFF file could not be found, so the model cannot be retrained.")
+            with self.metrics.phase("arff"), ArffWriter.append(log_file, sparse=self.sparse,
+                                                               compresslevel=self.compresslevel()) as writer:
+                self.write_arff(writer, instances)
+            self.metrics.finish()
+            save_as = None if self.is_cached(self.model_file) else self.model_file
+            self.run_train(training_file=log_file, save_as=save_as, folds=folds)
+            return
+        if self.verbose:
+            print("Updating your classifier...")
+        start_time = time.time()
+        if not isinstance(instances, Dataset):
+            instances = list(instances)  # written twice: to the log and to the update file
+        if log_file is not None:
+            with self.metrics.phase("arff"), ArffWriter.append(log_file, sparse=self.sparse,
+                                                               compresslevel=self.compresslevel()) as writer:
+                self.write_arff(writer, instances)
+        if self.is_cached(self.model_file):  # never change a cached model in place
+            model_file = self.model_dir + "/" + str(self.id) + ".model"
+            shutil.copyfile(self.model_file, model_file)
+            self.generated_files.append(model_file)
+            self.model_file = model_file
+        attributes = None
+        if log_file is not None:
+            with open_arff(log_file) as arff:
+                attributes = header_schema(read_header(arff))
+        options = java_command(self.max_memory, self.classpath, self.profile)
+        if self.transport == "pipe":
+            options.extend(["wekapy.update", self.model_file, "-"])
+            with self.metrics.phase("process"):
+                self.executor.run(options, self.metrics, ArffStream(instances, str(self.id), self.sparse,
+                                                                    attributes, self.metrics))
+        else:
+            update_file = self.arff_dir + "/" + str(self.id) + "-update" + self.arff_extension()
+            try:
+                with self.metrics.phase("arff"), ArffWriter(update_file, str(self.id), sparse=self.sparse,
+                                                            compresslevel=self.compresslevel()) as writer:
+                    if attributes is not None:
+                        writer.write_header(attributes)
+                    self.write_arff(writer, instances)
+                self.metrics.add_rows(rows_in=writer.rows)
+                self.add_file_size(update_file, "in")
+                options.extend(["wekapy.update", self.model_file, update_file])
+                with self.metrics.phase("process"):
+                    self.executor.run(options, self.metrics)
+            finally:
+                if os.path.exists(update_file):
+                    os.remove(update_file)
+        self.evaluation = None  # the training evaluation no longer describes the model
+        self.add_file_size(self.model_file, "out")
+        self.metrics.finish()
+        self.time_taken = time.time() - start_time
+        if self.verbose:
+            print("Update complete (time taken = {:.2f}s).".format(self.time_taken))
+
+    # The training ARFF file that update() appends to, or None if there is none. A file passed to
+    # train() belongs to the caller and is never changed: the first update copies it into arff_dir,
+    # and the copy becomes this Model's training file.
+    def training_log(self):
+        if self.training_file is None or not os.path.exists(self.training_file):
+            return None
+        if self.training_file not in self.generated_files:
+            extension = ".arff.gz" if str(self.training_file).endswith(".gz") else ".arff"
+            log_file = self.arff_dir + "/" + str(self.id) + "-training" + extension
+            shutil.copyfile(self.training_file, log_file)
+            self.generated_files.append(log_file)
+            self.training_file = log_file
+        return self.training_file
+
+    def is_cached(self, model_file):
+        return self.cache is not None and \
+            os.path.dirname(os.path.abspath(model_file)) == os.path.abspath(self.cache.cache_dir)
+
+    # Work out which model and test ARFF file to use, generating the ARFF file (named arff_file, if
+    # given) if needed. Returns (test file, None), or with pipe=True (by default, if
+    # transport="pipe") (None, ArffStream) for instances to be written to Weka while it runs.
+    def prepare_test(self, test_file=None, instances=None, model_file=None, pipe=None, arff_file=None, metrics=None):
+        if pipe is None:
+            pipe = self.transport == "pipe"
+        write_input = None
+        own_file = arff_file is None
         if model_file is not None:
             self.load_model(model_file)
         if not self.trained:
@@ -132,42 +444,264 @@ class Model:
                 raise WekaPyException(
                     "Please provide some test instances either by naming an ARFF test_set, providing a list of Instances, or calling add_test_instance().")
             if test_file is None:
-                self.create_arff(instances, "test")
-            if instances is None:
-                self.test_file = test_file
+                test_file, write_input = self.prepare_data(instances, "test", pipe, arff_file, metrics)
         if len(self.testing_instances) > 0:
             if test_file is None and instances is None:
-                self.create_arff(self.testing_instances, "test")
+                test_file, write_input = self.prepare_data(self.testing_instances, "test", pipe, arff_file, metrics)
             if test_file is None and instances is not None:
-                self.create_arff(instances, "test")
-            if instances is None and test_file is not None:
-                self.test_file = test_file
-
-        options = ["java", "-Xmx{}M".format(str(self.max_memory))]
-        if self.classpath is not None:
-            options.extend(["-cp", self.classpath])
-        options.extend(["weka.classifiers." + self.classifier, "-T", self.test_file, "-l", self.model_file, "-p", "0"])
-        process_output, self.time_taken = run_process(options)
-
-        lines = process_output.split("\n")
-        instance_predictions = []
-        for line in lines:
-            pred = line.split()
-            if len(pred) >= 4 and not pred[0].startswith("=") and not pred[0].startswith("inst"):
-                index = int(pred[0])
-                ob_cat = int((pred[1].split(":"))[0])
-                ob_val = str((pred[1].split(":"))[1])
-                p_cat = int((pred[2].split(":"))[0])
-                p_val = str((pred[2].split(":"))[1])
-                error = False
-                if "+" in pred[3]:
-                    error = True
-                    prob = float(pred[4])
+                test_file, write_input = self.prepare_data(instances, "test", pipe, arff_file, metrics)
+        if own_file:
+            self.test_file = test_file
+        return test_file, write_input
+
+    # Build the Weka command for generating predictions for an ARFF file with the trained model,
+    # or for data written to its stdin if test_file is "-". With distribution=True, Weka outputs
+    # the probability of every class instead of just the predicted one's.
+    def predict_command(self, test_file, max_memory=None, distribution=False):
+        options = java_command(max_memory or self.max_memory, self.classpath, self.profile)
+        if test_file == "-":
+            options.append("wekapy.test")
+        options.extend(["weka.classifiers." + self.classifier, "-T", test_file, "-l", self.model_file, "-p", "0"])
+        if distribution:
+            options.append("-distribution")
+        return options
+
+    # Return the labels of the class attribute (the last one) declared in an ARFF file's header,
+    # or in the attributes written by an ArffStream.
+    def class_labels(self, test_file=None, write_input=None):
+        if write_input is not None:
+            attributes = write_input.attributes or []
+        else:
+            with open_arff(test_file) as arff:
+                attributes = header_schema(read_header(arff))
+        if len(attributes) == 0:
+            raise WekaPyException("No attributes found in the test data.")
+        kind, labels = parse_possible_values(attributes[-1][1])
+        if kind != NOMINAL:
+            raise WekaPyException("Class distributions need a nominal class attribute.")
+        return labels
+
+    # Generate predictions from the trained model from test features in an ARFF file.
+    # With distribution=True a PredictionMatrix holding every class's probability is returned
+    # instead of a list of Predictions.
+    def test(self, test_file=None, instances=None, model_file=None, workers=1, distribution=False):
+        if workers > 1:
+            return self.parallel_test(test_file, instances, model_file, workers, distribution)
+        if self.verbose:
+            print("Generating predictions for your test set...")
+        self.start_metrics("test")
+        test_file, write_input = self.prepare_test(test_file, instances, model_file)
+        self.add_file_size(test_file, "in")
+        with self.metrics.phase("process"):
+            process_output, self.time_taken = self.executor.run(
+                self.predict_command(test_file or "-", distribution=distribution), self.metrics, write_input)
+        labels = self.class_labels(test_file, write_input) if distribution else None
+        predictions = self.finish_test(process_output, labels)
+        self.cleanup_test()
+        return predictions
+
+    # Parse Weka's predictions output into self.predictions, as a PredictionMatrix if the class
+    # labels are given. The run is recorded in metrics (by default self.metrics).
+    def finish_test(self, process_output, labels=None, metrics=None, time_taken=None):
+        metrics = metrics if metrics is not None else self.metrics
+        time_taken = time_taken if time_taken is not None else self.time_taken
+        with metrics.phase("parse"):
+            if labels is not None:
+                instance_predictions = PredictionMatrix.parse(process_output, labels)
+            else:
+                instance_predictions = []
+                for line in process_output.split("\n"):
+                    prediction = parse_prediction(line)
+                    if prediction is not None:
+                        instance_predictions.append(prediction)
+        metrics.add_bytes(bytes_out=len(process_output))
+        metrics.add_rows(rows_out=len(instance_predictions))
+        metrics.finish()
+        self.predictions = instance_predictions
+        self.time_taken = time_taken
+        self.metrics = metrics
+        if self.verbose:
+            print("Testing complete (time taken = {:.2f}s).".format(time_taken))
+        return instance_predictions
+
+    # Generate predictions as test() does, from a coroutine (see atrain()). Several calls can run
+    # concurrently on the same Model: each writes its own ARFF file (deleted once it has finished)
+    # and records its own Metrics. self.predictions, self.time_taken and self.metrics are those
+    # of the last call to finish.
+    async def atest(self, test_file=None, instances=None, model_file=None, limiter=None, distribution=False):
+        if self.verbose:
+            print("Generating predictions for your test set...")
+        loop = asyncio.get_event_loop()
+        metrics = Metrics("test", self.hooks)
+        arff_file = "{}/{}-test-{}{}".format(self.arff_dir, str(self.id), uuid.uuid4().hex, self.arff_extension())
+        test_file, write_input = await loop.run_in_executor(
+            None, lambda: self.prepare_test(test_file, instances, model_file, arff_file=arff_file, metrics=metrics))
+        try:
+            self.add_file_size(test_file, "in", metrics)
+            with metrics.phase("process"):
+                process_output, time_taken = await self.arun(
+                    self.predict_command(test_file or "-", distribution=distribution), limiter, write_input, metrics)
+            labels = self.class_labels(test_file, write_input) if distribution else None
+            return self.finish_test(process_output, labels, metrics, time_taken)
+        finally:
+            if test_file == arff_file:
+                self.remove_generated([arff_file])
+
+    # Generate predictions as test() does, but yield each one as soon as Weka outputs it.
+    # Predictions are not kept in self.predictions, so memory use stays bounded.
+    def iter_predictions(self, test_file=None, instances=None, model_file=None):
+        if self.verbose:
+            print("Streaming predictions for your test set...")
+        metrics = self.start_metrics("test")
+        test_file, write_input = self.prepare_test(test_file, instances, model_file)
+        self.add_file_size(test_file, "in")
+        start_time = time.time()
+        rows = 0
+        for line in self.executor.stream(self.predict_command(test_file or "-"), metrics, write_input):
+            metrics.add_bytes(bytes_out=len(line))
+            prediction = parse_prediction(line)
+            if prediction is not None:
+                rows += 1
+                yield prediction
+        self.time_taken = time.time() - start_time
+        metrics.add_phase("process", self.time_taken)  # includes the time spent by the caller between predictions
+        metrics.add_rows(rows_out=rows)
+        metrics.finish()
+        self.cleanup_test()
+        if self.verbose:
+            print("Testing complete (time taken = {:.2f}s).".format(self.time_taken))
+
+    # Split the test set into shards and score them against the same model in parallel JVMs.
+    # max_memory is shared between the JVMs, so fewer are started if each would get less
+    # than MIN_JVM_MEMORY.
+    def parallel_test(self, test_file=None, instances=None, model_file=None, workers=2, distribution=False):
+        if not isinstance(workers, int) or workers < 1:
+            raise WekaPyException("'workers' argument must be a positive (int).")
+        metrics = self.start_metrics("test")
+        test_file, write_input = self.prepare_test(test_file, instances, model_file, pipe=False)  # shards are files
+        self.add_file_size(test_file, "in")
+        labels = self.class_labels(test_file) if distribution else None
+        start_time = time.time()
+        shard_start = time.time()
+        rows = count_rows(test_file)
+        workers = max(1, min(workers, rows, self.max_memory // MIN_JVM_MEMORY))
+        shard_memory = self.max_memory // workers
+        if self.verbose:
+            print("Generating predictions for your test set in {} shards...".format(workers))
+
+        shards = []
+        with open_arff(test_file) as arff:
+            header = "".join(read_header(arff))
+            shard_size = -(-rows // workers)
+            shard = None
+            offset = 0
+            count = 0
+            for line in arff:
+                if not is_data_line(line):
+                    continue
+                if shard is None or count == shard_size:
+                    if shard is not None:
+                        shard.close()
+                    offset += count
+                    count = 0
+                    shard_file = "{}/{}-test-shard{}{}".format(self.arff_dir, str(self.id), len(shards),
+                                                                self.arff_extension())
+                    shards.append((shard_file, offset))
+                    shard = open_arff(shard_file, "w", self.compresslevel())
+                    shard.write(header)
+                shard.write(line)
+                count += 1
+            if shard is not None:
+                shard.close()
+        metrics.add_phase("shard", time.time() - shard_start)
+
+        def score(shard):
+            shard_file, offset = shard
+            process_output, time_taken = self.executor.run(
+                self.predict_command(shard_file, shard_memory, distribution), metrics)
+            with metrics.phase("parse"):
+                if labels is not None:
+                    predictions = PredictionMatrix.parse(process_output, labels, offset)
                 else:
-                    prob = float(pred[3])
-                prediction = Prediction(index, ob_cat, ob_val, p_cat, p_val, error, prob)
-                instance_predictions.append(prediction)
+                    predictions = []
+                    for line in process_output.split("\n"):
+                        prediction = parse_prediction(line)
+                        if prediction is not None:
+                            prediction.index += offset
+                            predictions.append(prediction)
+            metrics.add_bytes(bytes_out=len(process_output))
+            return predictions, time_taken
+
+        instance_predictions = PredictionMatrix(labels) if labels is not None else []
+        self.shard_times = []
+        try:
+            with metrics.phase("process"), ThreadPoolExecutor(max_workers=workers) as pool:
+                for i, (predictions, time_taken) in enumerate(pool.map(score, shards)):
+                    instance_predictions.extend(predictions)
+                    self.shard_times.append({"shard": i, "rows": len(predictions), "time_taken": time_taken})
+        finally:
+            for shard_file, offset in shards:
+                os.remove(shard_file)
         self.predictions = instance_predictions
+        self.time_taken = time.time() - start_time
+        metrics.add_rows(rows_out=len(instance_predictions))
+        metrics.finish()
+        self.cleanup_test()
         if self.verbose:
+            for shard_time in self.shard_times:
+                print("Shard {shard}: {rows} predictions (time taken = {time_taken:.2f}s).".format(**shard_time))
             print("Testing complete (time taken = {:.2f}s).".format(self.time_taken))
         return instance_predictions
+
+    # Start merging predict_one()/predict_many() calls into micro-batches of at most max_batch_size
+    # instances, waiting at most max_wait seconds for a batch to fill.
+    def start_batching(self, max_batch_size=64, max_wait=0.005):
+        with self.batcher_lock:
+            if self.batcher is not None:
+                self.batcher.stop()
+            self.batcher = MicroBatcher(self, max_batch_size, max_wait)
+
+    def stop_batching(self):
+        with self.batcher_lock:
+            if self.batcher is not None:
+                self.batcher.stop()
+                self.batcher = None
+
+    # Predict a single Instance with the trained model, which is kept loaded in a resident Weka
+    # worker. Concurrent calls are merged into micro-batches (see start_batching()).
+    def predict_one(self, instance, timeout=None):
+        return self.submit_prediction(instance).result(timeout)
+
+    # Predict several Instances as predict_one() does, returning their Predictions in order.
+    def predict_many(self, instances, timeout=None):
+        futures = [self.submit_prediction(instance) for instance in instances]
+        return [future.result(timeout) for future in futures]
+
+    def submit_prediction(self, instance):
+        if not isinstance(instance, Instance):
+            raise WekaPyException("Argument 'instance' must be of type Instance.")
+        if not self.trained:
+            raise WekaPyException("The classifier has not yet been trained. Please call train() first")
+        with self.batcher_lock:
+            if self.batcher is None:
+                self.batcher = MicroBatcher(self)
+            batcher = self.batcher
+        return batcher.submit(instance)
+
+    # Request count, p50/p99 latency (in seconds) and mean batch size for predict_one()/predict_many()
+    def latency_stats(self):
+        if self.batcher is None:
+            return LatencyStats().summary()
+        return self.batcher.stats.summary()
+
+    # Stop batching and delete every ARFF and model file this Model generated. Models saved with
+    # save_as, loaded with load_model() or kept in a ModelCache are left alone.
+    def close(self):
+        self.stop_batching()
+        self.remove_generated(list(self.generated_files))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,181 @@
+# ModelCache class
+#
+# Used externally, by passing a ModelCache to a Model, to avoid retraining identical models.
+# Trained models are stored under a key made from a hash of the training ARFF file's content,
+# the classifier type and options, the number of folds and the Weka installation (the jar
+# files on the classpath). When Model.train() is called again with the same inputs, by this or
+# any other process sharing cache_dir, the cached model is used instead of retraining.
+# Entries are evicted least-recently-used first once the cache grows beyond max_size bytes,
+# and once they have not been used for max_age seconds.
+
+from wekapy.WekaPyException import WekaPyException
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on this platform
+    fcntl = None
+
+
+# Identify the Weka installation by the size and modification time of each classpath entry.
+def classpath_fingerprint(classpath):
+    if classpath is None:
+        classpath = os.environ.get("CLASSPATH", "")
+    fingerprint = []
+    for entry in classpath.split(os.pathsep):
+        if entry and os.path.isfile(entry):
+            stat = os.stat(entry)
+            fingerprint.append("{}:{}:{}".format(os.path.abspath(entry), stat.st_size, int(stat.st_mtime)))
+    return ";".join(fingerprint)
+
+
+class ModelCache:
+    def __init__(self, cache_dir="wekapy_data/cache", max_size=None, max_age=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, training_file, classifier, options=None, folds=10, classpath=None):
+        digest = hashlib.sha256()
+        opener = gzip.open if training_file.endswith(".gz") else open  # hash the uncompressed content
+        with opener(training_file, "rb") as arff:
+            # the @relation name is skipped, since WekaPy names generated ARFF files after each Model's id
+            for line in iter(arff.readline, b""):
+                if not line.strip().lower().startswith(b"@relation"):
+                    digest.update(line)
+                if line.strip().lower().startswith(b"@data"):
+                    break
+            for chunk in iter(lambda: arff.read(1 << 20), b""):
+                digest.update(chunk)
+        for part in [classifier, "\0".join(options or []), str(folds), classpath_fingerprint(classpath)]:
+            digest.update(b"\0" + part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def model_path(self, key):
+        return os.path.join(self.cache_dir, key + ".model")
+
+    def output_path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    # Hold an exclusive lock on the cache directory, shared with other processes.
+    def lock(self):
+        return CacheLock(os.path.join(self.cache_dir, ".lock"))
+
+    # Return (model file, Weka's training output) for a key, or None on a miss.
+    def lookup(self, key):
+        with self.lock():
+            model_file = self.model_path(key)
+            if not os.path.exists(model_file) or self.expired(model_file, time.time()):
+                self.misses += 1
+                return None
+            os.utime(model_file, None)  # mark as recently used
+            output = ""
+            if os.path.exists(self.output_path(key)):
+                with open(self.output_path(key)) as output_file:
+                    output = output_file.read()
+        self.hits += 1
+        return model_file, output
+
+    # Copy a trained model (and the output Weka printed while training it) into the cache.
+    def store(self, key, model_file, output=""):
+        if not os.path.exists(model_file):
+            raise WekaPyException("The model to cache could not be found.")
+        descriptor, scratch_model = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(descriptor)
+        shutil.copyfile(model_file, scratch_model)
+        descriptor, scratch_output = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(descriptor, "w") as output_file:
+            output_file.write(output)
+        with self.lock():
+            os.rename(scratch_output, self.output_path(key))
+            os.rename(scratch_model, self.model_path(key))
+            self.stores += 1
+            self.evict()
+        return self.model_path(key)
+
+    def expired(self, model_file, now):
+        return self.max_age is not None and now - os.path.getmtime(model_file) > self.max_age
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".model"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                size = stat.st_size
+                output_file = path[:-len(".model")] + ".txt"
+                if os.path.exists(output_file):
+                    size += os.path.getsize(output_file)
+                entries.append((stat.st_mtime, size, name[:-len(".model")]))
+        return entries
+
+    def remove(self, key):
+        for path in (self.model_path(key), self.output_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.evictions += 1
+
+    # Remove expired entries, then the least recently used ones until the cache fits in max_size.
+    # Must be called with the cache locked.
+    def evict(self):
+        now = time.time()
+        entries = sorted(self.entries())
+        if self.max_age is not None:
+            for used, size, key in [entry for entry in entries if now - entry[0] > self.max_age]:
+                self.remove(key)
+            entries = [entry for entry in entries if now - entry[0] <= self.max_age]
+        if self.max_size is not None:
+            total = sum(size for used, size, key in entries)
+            for used, size, key in entries:
+                if total <= self.max_size:
+                    break
+                self.remove(key)
+                total -= size
+
+    def clear(self):
+        with self.lock():
+            for used, size, key in self.entries():
+                self.remove(key)
+
+    def stats(self):
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(size for used, size, key in entries),
+        }
+
+
+class CacheLock:
+    def __init__(self, path):
+        self.path = path
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        self.lock_file.close()
@@ -8,7 +8,7 @@
 class Prediction:
     def __init__(self, index, observed_1, observed_2, pred_1, pred_2, error, prob):
         self.index = int(index)
-        self.observed_category = int(observed_1)
+        self.observed_category = int(observed_1) if observed_1 not in (None, "", "?") else None
         self.observed_value = observed_2
         self.predicted_category = int(pred_1)
         self.predicted_value = pred_2
@@ -18,3 +18,31 @@ class Prediction:
     def __str__(self):
         return "{}:\tobserved: {}\tpredicted: {}\tprob: {}".format(str(self.index), str(self.observed_value),
                                                                    str(self.predicted_value), str(self.probability))
+
+
+# Split one line of Weka's "-p 0" output into (index, actual, predicted, error, remaining tokens),
+# returning None for header and blank lines. The error column is only printed ("+") for wrong
+# predictions, so the tokens after it are found by looking for it rather than by position.
+def split_prediction(line):
+    pred = line.split()
+    if len(pred) < 3 or not pred[0].isdigit():
+        return None
+    error = len(pred) > 3 and pred[3] == "+"
+    return pred[0], pred[1], pred[2], error, pred[4:] if error else pred[3:]
+
+
+# Parse one line of Weka's "-p 0" output, returning None for header and blank lines.
+def parse_prediction(line):
+    tokens = split_prediction(line)
+    if tokens is None or not tokens[4]:
+        return None
+    index, actual, predicted, error, rest = tokens
+    if ":" in actual:
+        ob_cat, separator, ob_val = actual.partition(":")
+    else:  # some Weka versions print a missing actual value as a bare "?"
+        ob_cat, ob_val = None, actual
+    p_cat, separator, p_val = predicted.partition(":")
+    probability = rest[0]
+    if "," in probability:  # a "-distribution" line: use the predicted class's (starred) probability
+        probability = [value for value in probability.split(",") if value.startswith("*")][0][1:]
+    return Prediction(index, ob_cat, ob_val, p_cat, p_val, error, probability)
@@ -0,0 +1,101 @@
+# PredictionMatrix class
+#
+# Used internally and externally as a compact, column-oriented alternative to a list of
+# Predictions, returned by Model.test(distribution=True). Weka's "-distribution" output is
+# parsed straight into arrays, without a Python object per row:
+#   - index: the 1-based instance numbers
+#   - actual, predicted: class codes (indexes into labels, -1 when missing)
+#   - error: 1 where the predicted class is not the actual one
+#   - probabilities: an N x C matrix (stored row by row) of the probability of each class
+# The class labels are taken from the test file's header.
+
+from wekapy.Prediction import Prediction, split_prediction
+from wekapy.WekaPyException import WekaPyException
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Convert a "code:label" token from Weka's predictions into a 0-based class code (-1 if missing).
+def class_code(token):
+    code, separator, label = token.partition(":")
+    if not separator or label == "?" or not code.isdigit():
+        return -1
+    return int(code) - 1
+
+
+class PredictionMatrix:
+    def __init__(self, labels):
+        self.labels = list(labels)
+        code_type = "h" if len(self.labels) < 32767 else "i"
+        self.index = array("i")
+        self.actual = array(code_type)
+        self.predicted = array(code_type)
+        self.error = array("b")
+        self.probabilities = array("d")
+
+    # Parse Weka's "-p 0 -distribution" output. offset is added to each instance number, for
+    # output from a shard of a larger test set.
+    @classmethod
+    def parse(cls, process_output, labels, offset=0):
+        matrix = cls(labels)
+        for line in process_output.split("\n"):
+            matrix.parse_line(line, offset)
+        return matrix
+
+    def parse_line(self, line, offset=0):
+        tokens = split_prediction(line)
+        if tokens is None:
+            return False
+        index, actual, predicted, error, rest = tokens
+        if not rest:
+            raise WekaPyException("Weka's output has no class distribution; was -distribution passed?")
+        distribution = rest[0].replace("*", "").split(",")
+        if len(distribution) != len(self.labels):
+            raise WekaPyException("A distribution has {} values, but the class has {} labels.".format(
+                len(distribution), len(self.labels)))
+        self.index.append(int(index) + offset)
+        self.actual.append(class_code(actual))
+        self.predicted.append(class_code(predicted))
+        self.error.append(1 if error else 0)
+        self.probabilities.extend(float(value) for value in distribution)
+        return True
+
+    # Append the rows of another PredictionMatrix with the same labels.
+    def extend(self, other):
+        if other.labels != self.labels:
+            raise WekaPyException("Cannot combine predictions for different class labels.")
+        self.index.extend(other.index)
+        self.actual.extend(other.actual)
+        self.predicted.extend(other.predicted)
+        self.error.extend(other.error)
+        self.probabilities.extend(other.probabilities)
+
+    def __len__(self):
+        return len(self.index)
+
+    # The probability of each class for row i.
+    def distribution(self, i):
+        width = len(self.labels)
+        return list(self.probabilities[i * width:(i + 1) * width])
+
+    # The probability matrix as an N x C NumPy array sharing this object's memory, or as a list
+    # of rows when NumPy is not available.
+    def matrix(self):
+        if numpy is not None:
+            return numpy.frombuffer(self.probabilities, dtype=numpy.float64).reshape(len(self), len(self.labels))
+        return [self.distribution(i) for i in range(len(self))]
+
+    # Convert to a list of Predictions, for code written against Model.test()'s default output.
+    def predictions(self):
+        predictions = []
+        for i in range(len(self)):
+            actual = self.actual[i]
+            predicted = self.predicted[i]
+            predictions.append(Prediction(self.index[i], actual + 1 if actual >= 0 else None,
+                                          self.labels[actual] if actual >= 0 else "?", predicted + 1,
+                                          self.labels[predicted] if predicted >= 0 else "?", self.error[i],
+                                          max(self.distribution(i))))
+        return predictions
@@ -0,0 +1,92 @@
+# SparseInstance class
+#
+# Used internally and externally to represent an Instance with mostly zero values, such as a
+# bag-of-words vector. A SparseInstance holds the full list of (name, possible_values)
+# attributes, which should be shared by all instances of the same dataset, and stores only the
+# Features with non-zero values, keyed by attribute index.
+# As in Weka's sparse ARFF format, a left-out numeric value is 0 and a left-out nominal value is
+# the attribute's first possible value.
+
+from wekapy.WekaPyException import WekaPyException
+from wekapy.Instance import Instance
+from wekapy.Feature import Feature
+from wekapy.Dataset import parse_possible_values, NUMERIC, NOMINAL
+from collections import OrderedDict
+import threading
+
+# attribute name -> index lookups for the most recently used attribute lists, shared between
+# instances with the same list. Each entry keeps its list alive, so its id cannot be reused while
+# it is cached, and the least recently used entry is dropped once there are MAX_INDEXES.
+# INDEXES_LOCK guards it, since instances may be built in several threads (e.g. by callers of
+# Model.predict_one()).
+MAX_INDEXES = 16
+INDEXES = OrderedDict()
+INDEXES_LOCK = threading.Lock()
+
+
+def attribute_index(attributes):
+    key = id(attributes)
+    with INDEXES_LOCK:
+        entry = INDEXES.get(key)
+        if entry is not None and entry[0] is attributes:
+            INDEXES.move_to_end(key)
+            return entry[1]
+    index = dict((name, i) for i, (name, possible_values) in enumerate(attributes))
+    with INDEXES_LOCK:
+        INDEXES[key] = (attributes, index)
+        INDEXES.move_to_end(key)
+        while len(INDEXES) > MAX_INDEXES:
+            INDEXES.popitem(last=False)
+    return index
+
+
+# The value a sparse row leaves out for an attribute, or None if values of this type are never left out.
+def zero_value(possible_values):
+    kind, categories = parse_possible_values(possible_values)
+    if kind == NUMERIC:
+        return 0
+    if kind == NOMINAL:
+        return categories[0]
+    return None
+
+
+class SparseInstance(Instance):
+    __slots__ = ("attributes", "sparse_features")
+
+    def __init__(self, attributes, features=None):
+        self.attributes = attributes
+        self.sparse_features = {}
+        for feature in features or []:
+            self.add_feature(feature)
+
+    def add_feature(self, feature, index=None):
+        if not isinstance(feature, Feature):
+            raise WekaPyException("Argument 'feature' must be of type Feature.")
+        if index is None:
+            index = attribute_index(self.attributes).get(feature.name)
+            if index is None:
+                raise WekaPyException("'{}' is not one of the instance's attributes.".format(feature.name))
+        self.sparse_features[index] = feature
+
+    def add_features(self, features_list):
+        for feature in features_list:
+            self.add_feature(feature)
+
+    # Set a value by attribute index, without building a Feature first.
+    def set_value(self, index, value):
+        name, possible_values = self.attributes[index]
+        self.sparse_features[index] = Feature(name, value, possible_values)
+
+    # The full list of Features, with the left-out values filled in, for code expecting an Instance.
+    @property
+    def features(self):
+        features = []
+        for i, (name, possible_values) in enumerate(self.attributes):
+            if i in self.sparse_features:
+                features.append(self.sparse_features[i])
+            else:
+                features.append(Feature(name, zero_value(possible_values), possible_values))
+        return features
+
+    def density(self):
+        return float(len(self.sparse_features)) / len(self.attributes) if self.attributes else 1.0
@@ -0,0 +1,102 @@
+# warmup()
+#
+# Builds the class data sharing (AppCDS) archive that LaunchProfiles use for a classpath. A
+# resident worker JVM runs a representative workload (training, testing and filtering a small
+# generated data set) while recording the classes it loads. A second JVM then dumps those classes
+# into an archive in archive_dir, which every later JVM started for the same classpath maps
+# instead of loading and verifying weka.jar's classes again. Needs JDK 11 or later.
+# Rebuild the archive after upgrading Java or Weka; until then JVMs ignore it.
+# Also run from the command line as `python -m wekapy warmup`.
+
+from wekapy.ArffWriter import ArffWriter
+from wekapy.Executor import Worker
+from wekapy.Feature import Feature
+from wekapy.Helpers import check_error
+from wekapy.Instance import Instance
+from wekapy.LaunchProfile import ARCHIVE_DIR, archive_file, effective_classpath
+from wekapy.WekaPyException import WekaPyException
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+
+WARMUP_CLASSIFIERS = ("bayes.NaiveBayes", "trees.J48", "functions.Logistic")
+WARMUP_FILTERS = (
+    ["weka.filters.unsupervised.attribute.Normalize"],
+    ["weka.filters.unsupervised.attribute.Discretize"],
+)
+
+
+# A small data set with numeric and nominal attributes and a nominal class.
+def warmup_instances(rows=100, seed=0):
+    generator = random.Random(seed)
+    for i in range(rows):
+        label = generator.choice(["yes", "no"])
+        shift = 1.0 if label == "yes" else 0.0
+        yield Instance([
+            Feature("x0", round(generator.gauss(shift, 1), 4), "numeric"),
+            Feature("x1", round(generator.gauss(-shift, 1), 4), "numeric"),
+            Feature("colour", generator.choice(["red", "green", "blue"]), "{red,green,blue}"),
+            Feature("class", label, "{yes,no}"),
+        ])
+
+
+# The worker requests run while the classes are recorded.
+def warmup_requests(data_file, work_dir, classifiers, filters):
+    requests = []
+    for i, classifier in enumerate(classifiers):
+        model_file = os.path.join(work_dir, "{}.model".format(i))
+        main = "weka.classifiers." + classifier
+        requests.append([main, "-x", "2", "-t", data_file, "-d", model_file])
+        requests.append([main, "-T", data_file, "-l", model_file, "-p", "0"])
+        requests.append(["wekapy.train", main, "-x", "2", "-t", data_file, "-d", model_file])
+        requests.append(["wekapy.test", main, "-T", data_file, "-l", model_file, "-p", "0", "-distribution"])
+    for i, filter_options in enumerate(filters):
+        output_file = os.path.join(work_dir, "filtered{}.arff".format(i))
+        requests.append(list(filter_options) + ["-i", data_file, "-o", output_file, "-c", "last"])
+    return requests
+
+
+# Build the class data sharing archive for a classpath, returning its path.
+def warmup(classpath=None, classifiers=WARMUP_CLASSIFIERS, filters=WARMUP_FILTERS, archive_dir=ARCHIVE_DIR,
+           build_root="wekapy_data/worker", verbose=False):
+    if not os.path.exists(archive_dir):
+        os.makedirs(archive_dir)
+    archive = archive_file(classpath, archive_dir)
+    work_dir = tempfile.mkdtemp(dir=archive_dir)
+    try:
+        data_file = os.path.join(work_dir, "warmup.arff")
+        with ArffWriter(data_file, "warmup") as writer:
+            writer.write_instances(warmup_instances())
+        class_list = os.path.join(work_dir, "classes.lst")
+        worker = Worker(["-Xshare:off", "-XX:DumpLoadedClassList=" + class_list,
+                         "-cp", effective_classpath(classpath)], build_root)
+        try:
+            for request in warmup_requests(data_file, work_dir, classifiers, filters):
+                if verbose:
+                    print("Running {}...".format(" ".join(request[:2])))
+                process_output, process_error = worker.request(request)
+                check_error(process_error)
+        finally:
+            worker.stop()
+        if not os.path.exists(class_list):
+            raise WekaPyException("Java did not record the classes it loaded; class data sharing needs JDK 11 or later.")
+
+        if verbose:
+            print("Dumping the class data sharing archive...")
+        # dumped with Weka's classpath alone, which is a prefix of the worker's too
+        scratch_archive = os.path.join(work_dir, "classes.jsa")
+        process = subprocess.Popen(["java", "-Xshare:dump", "-XX:SharedClassListFile=" + class_list,
+                                    "-XX:SharedArchiveFile=" + scratch_archive, "-cp", effective_classpath(classpath)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process_output, process_error = process.communicate()
+        if process.returncode != 0 or not os.path.exists(scratch_archive):
+            raise WekaPyException("Could not build the class data sharing archive: {}".format(
+                (process_error or process_output).decode('utf-8').strip()))
+        os.replace(scratch_archive, archive)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if verbose:
+        print("Built {}.".format(archive))
+    return archive
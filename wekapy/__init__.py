@@ -16,5 +16,17 @@
 
 from wekapy.Model import Model
 from wekapy.Filter import Filter
+from wekapy.FilterPipeline import FilterPipeline
 from wekapy.Feature import Feature
 from wekapy.Instance import Instance
+from wekapy.SparseInstance import SparseInstance
+from wekapy.Dataset import Dataset
+from wekapy.PredictionMatrix import PredictionMatrix
+from wekapy.ArffFile import ArffFile, read_arff
+from wekapy.Executor import ProcessExecutor, WorkerExecutor
+from wekapy.Experiment import Experiment
+from wekapy.ModelCache import ModelCache
+from wekapy.MemoryLimiter import MemoryLimiter
+from wekapy.Metrics import Metrics, add_hook, remove_hook
+from wekapy.LaunchProfile import LaunchProfile, set_default_profile
+from wekapy.Warmup import warmup
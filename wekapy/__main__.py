@@ -0,0 +1,37 @@
+# Command line entry point
+#
+#   python -m wekapy warmup [--classpath CLASSPATH] [--classifiers bayes.NaiveBayes ...]
+#
+# warmup builds the class data sharing archive that Models and Filters use to start their JVMs
+# faster (see LaunchProfile and Warmup).
+
+from wekapy.LaunchProfile import ARCHIVE_DIR
+from wekapy.Warmup import warmup, WARMUP_CLASSIFIERS
+from wekapy.WekaPyException import WekaPyException
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m wekapy")
+    commands = parser.add_subparsers(dest="command")
+    warmup_parser = commands.add_parser("warmup", help="build a class data sharing archive for faster JVM startup")
+    warmup_parser.add_argument("--classpath", help="Weka's classpath (by default $CLASSPATH)")
+    warmup_parser.add_argument("--classifiers", nargs="+", default=list(WARMUP_CLASSIFIERS),
+                               help="classifiers to train while recording the classes used")
+    warmup_parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                               help="where to write the archive (by default {})".format(ARCHIVE_DIR))
+    args = parser.parse_args(argv)
+    if args.command != "warmup":
+        parser.print_help()
+        return 2
+    try:
+        warmup(args.classpath, args.classifiers, archive_dir=args.archive_dir, verbose=True)
+    except WekaPyException as e:
+        sys.stderr.write("Warmup failed: {}\n".format(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+// WekaPyWorker
+//
+// Resident Weka JVM used by wekapy's WorkerExecutor.
+// Requests are read from stdin as a line holding the argument count, followed by one
+// argument per line (the first argument being the Weka main class). Each request is run
+// in-process with System.out and System.err captured, and the response is written back as
+// a "WEKAPY <status> <stdout bytes> <stderr bytes>" line followed by the captured output.
+// Deserialized models used with "-l" are kept in memory between requests, and read again when
+// the file's modification time or length changes, or after the worker runs a request that saves
+// a model to the same path with "-d".
+// The pseudo main class "wekapy.predict" takes a model file followed by the lines of an ARFF
+// file, and prints "-p 0" style predictions for it without the data touching the disk.
+// The pseudo main class "wekapy.update" takes a model file and an ARFF file, updates the model
+// (which must be an UpdateableClassifier) with each instance in turn and saves it in place.
+// The pseudo main classes "wekapy.train" and "wekapy.test" take the same options as a Weka
+// classifier's command line does for training ("-t <data> -d <model> -x <folds>") and testing
+// ("-T <data> -l <model> -p 0"), after the classifier's class name, and print the same output.
+// For these and "wekapy.update", a data location of "-" means the ARFF data is streamed with the
+// request instead of read from a file: in the request stream it follows the arguments, one line
+// at a time with each line prefixed by a space, and ends with a line that is not.
+// Run with arguments instead of a request stream, the worker runs that one request and exits,
+// reading "-" data from its stdin.
+
+import java.io.BufferedInputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.InputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.io.Reader;
+import java.io.StringReader;
+import java.lang.reflect.InvocationTargetException;
+import java.nio.file.Files;
+import java.nio.file.StandardCopyOption;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.Random;
+import java.util.zip.GZIPInputStream;
+import java.util.zip.GZIPOutputStream;
+
+import weka.classifiers.AbstractClassifier;
+import weka.classifiers.Classifier;
+import weka.classifiers.Evaluation;
+import weka.classifiers.UpdateableClassifier;
+import weka.classifiers.evaluation.output.prediction.PlainText;
+import weka.core.Instances;
+import weka.core.SerializationHelper;
+import weka.core.Utils;
+import weka.core.converters.ConverterUtils.DataSource;
+
+public class WekaPyWorker {
+
+    private static class CachedModel {
+        long modified;
+        long length;
+        Classifier classifier;
+        Instances header;
+    }
+
+    // Reads the ARFF data streamed with a request, up to the first line not prefixed by a space.
+    private static class RequestData extends Reader {
+        private final BufferedReader in;
+        private String line = "";
+        private int position = 0;
+        private boolean finished = false;
+
+        RequestData(BufferedReader in) {
+            this.in = in;
+        }
+
+        public int read(char[] buffer, int offset, int length) throws IOException {
+            if (length == 0) {
+                return 0;
+            }
+            while (position >= line.length()) {
+                if (finished) {
+                    return -1;
+                }
+                String next = in.readLine();
+                if (next == null || !next.startsWith(" ")) {
+                    finished = true;
+                    return -1;
+                }
+                line = next.substring(1) + "\n";
+                position = 0;
+            }
+            int count = Math.min(length, line.length() - position);
+            line.getChars(position, position + count, buffer, offset);
+            position += count;
+            return count;
+        }
+
+        // Skip whatever data the request's handler did not read, e.g. after an error.
+        void drain() throws IOException {
+            char[] skipped = new char[8192];
+            while (read(skipped, 0, skipped.length) != -1) {
+            }
+        }
+
+        public void close() {
+        }
+    }
+
+    private static final Map<String, CachedModel> MODELS = new HashMap<String, CachedModel>();
+
+    // Where "-" data is read from for the current request
+    private static Reader requestData;
+
+    public static void main(String[] args) throws Exception {
+        if (args.length > 0) {
+            runOnce(args);
+            return;
+        }
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        protocol.print("WEKAPY READY\n");
+        protocol.flush();
+        String line;
+        while ((line = in.readLine()) != null) {
+            line = line.trim();
+            if (line.length() == 0) {
+                continue;
+            }
+            int count = Integer.parseInt(line);
+            String[] request = new String[count];
+            for (int i = 0; i < count; i++) {
+                request[i] = in.readLine();
+            }
+            RequestData data = "-".equals(dataLocation(request)) ? new RequestData(in) : null;
+            respond(protocol, request, data);
+        }
+    }
+
+    // The data location of a pseudo main class request, or null.
+    private static String dataLocation(String[] request) {
+        if (request.length > 2 && request[0].equals("wekapy.update")) {
+            return request[2];
+        }
+        if (request[0].equals("wekapy.train")) {
+            return option(request, "-t");
+        }
+        if (request[0].equals("wekapy.test")) {
+            return option(request, "-T");
+        }
+        return null;
+    }
+
+    private static void respond(PrintStream protocol, String[] request, RequestData data) throws Exception {
+        PrintStream originalOut = System.out;
+        PrintStream originalErr = System.err;
+        ByteArrayOutputStream out = new ByteArrayOutputStream();
+        ByteArrayOutputStream err = new ByteArrayOutputStream();
+        int status = 0;
+        System.setOut(new PrintStream(out, true, "UTF-8"));
+        System.setErr(new PrintStream(err, true, "UTF-8"));
+        requestData = data;
+        try {
+            handle(request);
+        } catch (Throwable t) {
+            Throwable cause = t;
+            if (t instanceof InvocationTargetException && t.getCause() != null) {
+                cause = t.getCause();
+            }
+            System.err.println(cause.getClass().getName() + ": " + cause.getMessage());
+            status = 1;
+        } finally {
+            if (data != null) {
+                data.drain();
+            }
+            requestData = null;
+            System.out.flush();
+            System.err.flush();
+            System.setOut(originalOut);
+            System.setErr(originalErr);
+        }
+        byte[] outBytes = out.toByteArray();
+        byte[] errBytes = err.toByteArray();
+        protocol.print("WEKAPY " + status + " " + outBytes.length + " " + errBytes.length + "\n");
+        protocol.write(outBytes);
+        protocol.write(errBytes);
+        protocol.flush();
+    }
+
+    // One-shot mode: run a single request with the real stdout/stderr, reporting failures the way
+    // Weka's own main methods do.
+    private static void runOnce(String[] request) {
+        try {
+            requestData = new InputStreamReader(System.in, "UTF-8");
+            handle(request);
+        } catch (Throwable t) {
+            Throwable cause = t;
+            if (t instanceof InvocationTargetException && t.getCause() != null) {
+                cause = t.getCause();
+            }
+            System.err.println(cause.getClass().getName() + ": " + cause.getMessage());
+            System.exit(1);
+        }
+        System.out.flush();
+    }
+
+    private static void handle(String[] request) throws Exception {
+        String mainClass = request[0];
+        String[] options = new String[request.length - 1];
+        System.arraycopy(request, 1, options, 0, options.length);
+        String savedModel = option(options, "-d");
+        try {
+            dispatch(mainClass, options);
+        } finally {
+            // the model may have been rewritten within the file system's timestamp resolution
+            if (savedModel != null) {
+                MODELS.remove(new File(savedModel).getAbsolutePath());
+            }
+        }
+    }
+
+    private static void dispatch(String mainClass, String[] options) throws Exception {
+        if (mainClass.equals("wekapy.predict")) {
+            predictInline(options);
+            return;
+        }
+        if (mainClass.equals("wekapy.update")) {
+            update(options);
+            return;
+        }
+        if (mainClass.equals("wekapy.train")) {
+            train(options[0], Arrays.copyOfRange(options, 1, options.length));
+            return;
+        }
+        if (mainClass.equals("wekapy.test")) {
+            predict(Arrays.copyOfRange(options, 1, options.length));
+            return;
+        }
+        if (mainClass.startsWith("weka.classifiers.") && isCachedPrediction(options)) {
+            predict(options);
+            return;
+        }
+        Class.forName(mainClass).getMethod("main", String[].class).invoke(null, (Object) options);
+    }
+
+    // Test-only runs ("-T <file> -l <model> -p 0") can be answered from the in-memory model.
+    private static boolean isCachedPrediction(String[] options) {
+        boolean test = false;
+        boolean model = false;
+        boolean predictions = false;
+        for (int i = 0; i < options.length; i++) {
+            if (options[i].equals("-t") || options[i].equals("-x") || options[i].equals("-d")) {
+                return false;
+            }
+            test |= options[i].equals("-T");
+            model |= options[i].equals("-l");
+            predictions |= options[i].equals("-p");
+        }
+        return test && model && predictions;
+    }
+
+    private static String option(String[] options, String flag) {
+        for (int i = 0; i < options.length - 1; i++) {
+            if (options[i].equals(flag)) {
+                return options[i + 1];
+            }
+        }
+        return null;
+    }
+
+    private static boolean flag(String[] options, String flag) {
+        for (int i = 0; i < options.length; i++) {
+            if (options[i].equals(flag)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    // Read a data set from a file, or from the request's data if the location is "-".
+    private static Instances readData(String location) throws Exception {
+        if (location.equals("-")) {
+            return new Instances(new BufferedReader(requestData));
+        }
+        return new DataSource(location).getDataSet();
+    }
+
+    static CachedModel loadModel(String path) throws Exception {
+        File file = new File(path);
+        CachedModel cached = MODELS.get(file.getAbsolutePath());
+        if (cached != null && cached.modified == file.lastModified() && cached.length == file.length()) {
+            return cached;
+        }
+        InputStream stream = new BufferedInputStream(new FileInputStream(file));
+        if (path.endsWith(".gz")) {
+            stream = new GZIPInputStream(stream);
+        }
+        Object[] objects;
+        try {
+            objects = SerializationHelper.readAll(stream);
+        } finally {
+            stream.close();
+        }
+        cached = new CachedModel();
+        cached.modified = file.lastModified();
+        cached.length = file.length();
+        cached.classifier = (Classifier) objects[0];
+        if (objects.length > 1 && objects[1] instanceof Instances) {
+            cached.header = (Instances) objects[1];
+        }
+        MODELS.put(file.getAbsolutePath(), cached);
+        return cached;
+    }
+
+    private static void predict(String[] options) throws Exception {
+        CachedModel model = loadModel(option(options, "-l"));
+        Instances test = readData(option(options, "-T"));
+        printPredictions(model, test, flag(options, "-distribution"));
+    }
+
+    private static void predictInline(String[] options) throws Exception {
+        CachedModel model = loadModel(options[0]);
+        StringBuilder arff = new StringBuilder();
+        for (int i = 1; i < options.length; i++) {
+            arff.append(options[i]).append('\n');
+        }
+        Instances test = new Instances(new StringReader(arff.toString()));
+        printPredictions(model, test, false);
+    }
+
+    private static void update(String[] options) throws Exception {
+        String path = options[0];
+        CachedModel model = loadModel(path);
+        if (!(model.classifier instanceof UpdateableClassifier)) {
+            throw new Exception(model.classifier.getClass().getName() + " is not an UpdateableClassifier");
+        }
+        Instances data = readData(options[1]);
+        setClassIndex(model, data);
+        File file = new File(path);
+        File scratch = new File(path + ".tmp");
+        try {
+            UpdateableClassifier classifier = (UpdateableClassifier) model.classifier;
+            for (int i = 0; i < data.numInstances(); i++) {
+                classifier.updateClassifier(data.instance(i));
+            }
+            OutputStream stream = new FileOutputStream(scratch);
+            if (path.endsWith(".gz")) {
+                stream = new GZIPOutputStream(stream);
+            }
+            Object[] objects = model.header != null
+                ? new Object[] {model.classifier, model.header} : new Object[] {model.classifier};
+            SerializationHelper.writeAll(stream, objects);
+            Files.move(scratch.toPath(), file.toPath(), StandardCopyOption.REPLACE_EXISTING,
+                StandardCopyOption.ATOMIC_MOVE);
+        } catch (Exception e) {
+            // the cached classifier may be partly updated, so reload it from disk next time
+            MODELS.remove(file.getAbsolutePath());
+            scratch.delete();
+            throw e;
+        }
+        model.modified = file.lastModified();
+        model.length = file.length();
+        System.out.println("Updated " + path + " with " + data.numInstances() + " instances");
+    }
+
+    // Train and evaluate a classifier as its command line does with "-t <data> -d <model> -x <folds>",
+    // printing the model, the error on the training data and the cross-validation results.
+    private static void train(String classifierName, String[] options) throws Exception {
+        String commandLine = Utils.joinOptions(options);
+        String location = Utils.getOption('t', options);
+        String modelFile = Utils.getOption('d', options);
+        String folds = Utils.getOption('x', options);
+        Instances data = readData(location);
+        data.setClassIndex(data.numAttributes() - 1);
+        Classifier classifier = AbstractClassifier.forName(classifierName, options);
+        Classifier template = AbstractClassifier.makeCopy(classifier);
+
+        long start = System.currentTimeMillis();
+        classifier.buildClassifier(data);
+        double buildTime = (System.currentTimeMillis() - start) / 1000.0;
+        if (modelFile.length() > 0) {
+            OutputStream stream = new FileOutputStream(modelFile);
+            if (modelFile.endsWith(".gz")) {
+                stream = new GZIPOutputStream(stream);
+            }
+            SerializationHelper.writeAll(stream, new Object[] {classifier, new Instances(data, 0)});
+        }
+        boolean nominal = data.classAttribute().isNominal();
+
+        start = System.currentTimeMillis();
+        Evaluation training = new Evaluation(data);
+        training.evaluateModel(classifier, data);
+        double testTime = (System.currentTimeMillis() - start) / 1000.0;
+        StringBuilder output = new StringBuilder();
+        output.append("\nOptions: ").append(commandLine).append("\n\n");
+        output.append(classifier.toString()).append("\n");
+        output.append("\nTime taken to build model: ").append(Utils.doubleToString(buildTime, 2)).append(" seconds");
+        output.append("\nTime taken to test model on training data: ")
+            .append(Utils.doubleToString(testTime, 2)).append(" seconds\n");
+        output.append(training.toSummaryString("\n=== Error on training data ===\n", false));
+        if (nominal) {
+            output.append("\n\n").append(training.toClassDetailsString());
+            output.append("\n\n").append(training.toMatrixString());
+        }
+
+        int numFolds = folds.length() > 0 ? Integer.parseInt(folds) : 10;
+        start = System.currentTimeMillis();
+        Evaluation crossValidation = new Evaluation(data);
+        crossValidation.crossValidateModel(template, data, numFolds, new Random(1));
+        double crossValidationTime = (System.currentTimeMillis() - start) / 1000.0;
+        output.append("\n\nTime taken to perform cross-validation: ")
+            .append(Utils.doubleToString(crossValidationTime, 2)).append(" seconds\n");
+        output.append(crossValidation.toSummaryString("\n=== Stratified cross-validation ===\n", false));
+        if (nominal) {
+            output.append("\n\n").append(crossValidation.toClassDetailsString());
+            output.append("\n\n").append(crossValidation.toMatrixString());
+        }
+        System.out.println(output.toString());
+    }
+
+    private static void setClassIndex(CachedModel model, Instances data) {
+        if (model.header != null && model.header.classIndex() >= 0) {
+            data.setClassIndex(model.header.classIndex());
+        } else {
+            data.setClassIndex(data.numAttributes() - 1);
+        }
+    }
+
+    static void printPredictions(CachedModel model, Instances test, boolean distribution) throws Exception {
+        setClassIndex(model, test);
+        // as Weka's Evaluation does before testing a model
+        if (model.header != null && !model.header.equalHeaders(test)) {
+            throw new Exception("Train and test file not compatible!\n" + model.header.equalHeadersMsg(test));
+        }
+        StringBuffer buffer = new StringBuffer();
+        PlainText output = new PlainText();
+        output.setHeader(test);
+        output.setBuffer(buffer);
+        output.setOutputDistribution(distribution);
+        output.printHeader();
+        for (int i = 0; i < test.numInstances(); i++) {
+            output.printClassification(model.classifier, test.instance(i), i);
+        }
+        output.printFooter();
+        System.out.print(buffer.toString());
+    }
+}